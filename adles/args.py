@@ -72,6 +72,9 @@ def parse_cli_args() -> argparse.Namespace:
     # TODO:
     #   type=argparse.FileType(encoding='UTF-8')
     #   '-' argument...
+    validate.add_argument('--fail-fast', action='store_true',
+                          help='Stop at the first section of an exercise '
+                               'specification with errors')
     validate.add_argument('spec', help='The YAML specification file to validate')
 
     # Deployment phase
@@ -1,5 +1,7 @@
 import logging
 
+from adles.utils import read_json
+
 
 class Group:
     """ Manages a group of users that has been loaded from a specification """
@@ -29,7 +31,6 @@ class Group:
                 self.ad_group += " " + str(instance)
 
         elif "filename" in group:
-            from adles.utils import read_json
             group_type = "standard"
             if instance:    # Template group
                 users = [(user, pw)
@@ -1,6 +1,8 @@
 import logging
 from abc import ABC, abstractmethod
 
+from adles.group import Group
+
 
 class Interface(ABC):
     """Base class for all Interfaces."""
@@ -147,7 +149,6 @@ class Interface(ABC):
         :return: Group object
         :rtype: :class:`Group`
         """
-        from adles.group import Group
         if group_name in self.groups:
             group = self.groups[group_name]
             if isinstance(group, Group):    # Normal groups
@@ -1,7 +1,17 @@
 import logging
+from importlib import import_module
 
 from adles.interfaces import Interface
 
+# Module and class of the Interface for each infrastructure platform.
+# These are imported on use, since some of them need optional dependencies.
+PLATFORMS = {
+    "vmware-vsphere": ("adles.interfaces.vsphere_interface",
+                       "VsphereInterface"),
+    "docker": ("adles.interfaces.docker_interface", "DockerInterface"),
+    "cloud": ("adles.interfaces.cloud_interface", "CloudInterface"),
+}
+
 
 class PlatformInterface(Interface):
     """Generic interface used to uniformly interact with
@@ -20,32 +30,34 @@ class PlatformInterface(Interface):
         # Select the Interface to use based on
         # the specified infrastructure platform
         for platform, config in infra.items():
-            if platform == "vmware-vsphere":
-                from adles.interfaces.vsphere_interface import VsphereInterface
-                self.interfaces.append(VsphereInterface(config, spec))
-            elif platform == "docker":
-                from adles.interfaces.docker_interface import DockerInterface
-                self.interfaces.append(DockerInterface(config, spec))
-            elif platform == "cloud":
-                from adles.interfaces.cloud_interface import CloudInterface
-                self.interfaces.append(CloudInterface(config, spec))
-            else:
+            if platform not in PLATFORMS:
                 self._log.error("Invalid platform: %s", str(platform))
                 raise ValueError
+            module_name, class_name = PLATFORMS[platform]
+            interface = getattr(import_module(module_name), class_name)
+            self.interfaces.append(interface(config, spec))
+
+    def _run_phase(self, phase, **kwargs):
+        """
+        Runs a phase on each of the platform interfaces.
+
+        :param str phase: Name of the phase method to call
+        :param kwargs: Arguments to pass to the phase method
+        """
+        for interface in self.interfaces:
+            getattr(interface, phase)(**kwargs)
 
     # @time_execution
     def create_masters(self):
         """Master creation phase."""
         self._log.info("Creating Master instances for %s", self.metadata["name"])
-        for i in self.interfaces:
-            i.create_masters()
+        self._run_phase("create_masters")
 
     # @time_execution
     def deploy_environment(self):
         """Environment deployment phase."""
         self._log.info("Deploying environment for %s", self.metadata["name"])
-        for i in self.interfaces:
-            i.deploy_environment()
+        self._run_phase("deploy_environment")
 
     # @time_execution
     def cleanup_masters(self, network_cleanup=False):
@@ -55,8 +67,7 @@ class PlatformInterface(Interface):
         :param bool network_cleanup: If networks should be cleaned up
         """
         self._log.info("Cleaning up Master instances for %s", self.metadata["name"])
-        for i in self.interfaces:
-            i.cleanup_masters(network_cleanup=network_cleanup)
+        self._run_phase("cleanup_masters", network_cleanup=network_cleanup)
 
     # @time_execution
     def cleanup_environment(self, network_cleanup=False):
@@ -66,5 +77,4 @@ class PlatformInterface(Interface):
         :param bool network_cleanup: If networks should be cleaned up
         """
         self._log.info("Cleaning up environment for %s", self.metadata["name"])
-        for i in self.interfaces:
-            i.cleanup_masters(network_cleanup=network_cleanup)
+        self._run_phase("cleanup_environment", network_cleanup=network_cleanup)
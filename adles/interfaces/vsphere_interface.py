@@ -1,13 +1,17 @@
 import logging
 import os
 
+from pyVmomi import vim
+
+from adles.group import Group, get_ad_groups
 from adles.interfaces import Interface
 from adles.utils import get_vlan, pad, read_json
 from adles.vsphere import Vsphere
 from adles.vsphere.folder_utils import format_structure
 from adles.vsphere.network_utils import create_portgroup
 from adles.vsphere.vm import VM
-from adles.vsphere.vsphere_utils import VsphereException, is_folder, is_vm
+from adles.vsphere.vsphere_utils import VsphereException, is_folder, is_vm, \
+    wait_for_power_state, wait_for_tasks, wait_for_tasks_success
 
 
 class VsphereInterface(Interface):
@@ -108,7 +112,6 @@ class VsphereInterface(Interface):
         if "vswitch" in infra:
             self.vswitch_name = infra["vswitch"]
         else:
-            from pyVmomi import vim
             self.vswitch_name = self.server.get_item(vim.Network).name
 
         self._log.debug("Finished initializing VsphereInterface")
@@ -120,7 +123,6 @@ class VsphereInterface(Interface):
         :return: Initialized Groups
         :rtype: dict(:class:`Group`)
         """
-        from adles.group import Group, get_ad_groups
         groups = {}
 
         # Instantiate Groups
@@ -158,6 +160,7 @@ class VsphereInterface(Interface):
 
     def create_masters(self):
         """ Exercise Environment Master creation phase. """
+        self.server.clear_name_index()  # Objects may have changed since
 
         # Get folder containing templates
         self.template_folder = self.server_root.traverse_path(
@@ -188,7 +191,8 @@ class VsphereInterface(Interface):
         self._master_parent_folder_gen(self.folders, self.master_folder)
 
         # Output fully deployed master folder tree to debugging
-        self._log.debug(format_structure(self.root_folder.enumerate()))
+        if self._log.isEnabledFor(logging.DEBUG):  # Skip walking the tree
+            self._log.debug(format_structure(self.root_folder.enumerate()))
 
     def _master_parent_folder_gen(self, folder, parent):
         """
@@ -252,7 +256,9 @@ class VsphereInterface(Interface):
         # else:
         #     master_group = self._get_group(folder_dict["group"])
 
-        # Create Master instances
+        # Start cloning the Master instances
+        masters = []  # Master instances, with their service configurations
+        tasks = []  # Clone task of each Master instance (None if it exists)
         for sname, sconfig in folder_dict["services"].items():
             if not self._is_vsphere(sconfig["service"]):
                 self._log.debug("Skipping non-vsphere service '%s'", sname)
@@ -261,52 +267,72 @@ class VsphereInterface(Interface):
             self._log.info("Creating Master instance '%s' from service '%s'",
                            sname, sconfig["service"])
 
-            vm = self._create_service(parent, sconfig["service"],
-                                      sconfig["networks"])
+            vm, task = self._start_service(parent, sconfig["service"])
             if vm is None:
                 self._log.error("Failed to create Master instance '%s' "
                                 "in folder '%s'", sname, folder_name)
                 continue  # Skip to the next service
+            masters.append((sname, sconfig, vm))
+            tasks.append(task)
+
+        # Wait for all of the clones at once, then configure the Masters.
+        # Each clone is allowed as long as it had when waited on by itself.
+        for (sname, sconfig, vm), new_vm in zip(
+                masters, wait_for_tasks(tasks, timeout=120 * len(tasks))):
+            if new_vm is not None:
+                vm.bind(new_vm)
+            elif vm.get_vim_vm() is None:  # The clone failed
+                self._log.error("Failed to create Master instance '%s' "
+                                "in folder '%s'", sname, folder_name)
+                continue  # Skip to the next service
+            self._configure_service(vm, sconfig["service"],
+                                    sconfig["networks"])
 
-    def _create_service(self, folder, service_name, networks):
+    def _start_service(self, folder, service_name):
         """
-        Retrieves and clones a service into a master folder.
+        Starts cloning a service into a master folder.
 
         :param folder: Folder to create service in
         :type folder: vim.Folder
         :param str service_name: Name of the service to clone
-        :param list networks: Networks to configure the service with
-        :return: The service VM instance
-        :rtype: :class:`VM`
+        :return: The service VM instance and the task cloning it
+        (None if the service already exists), or (None, None) if it failed
+        :rtype: tuple(:class:`VM`, vim.Task)
         """
-        if not self._is_vsphere(service_name):
-            self._log.debug("Skipping non-vsphere service '%s'", service_name)
-            return None
-
         config = self.services[service_name]
         vm_name = self.master_prefix + service_name
 
         test = folder.traverse_path(vm_name)  # Check service already exists
-        if test is None:
-            # Find the template that matches the service definition
-            template = self.template_folder.traverse_path(config["template"])
-            if not template:
-                self._log.error("Could not find template '%s' for service '%s'",
-                                config["template"], service_name)
-                return None
-            self._log.info("Creating service '%s'", service_name)
-            vm = VM(name=vm_name, folder=folder,
-                    resource_pool=self.server.get_pool(),
-                    datastore=self.server.datastore, host=self.host)
-            if not vm.create(template=template):
-                return None
-        else:
+        if test is not None:
             self._log.warning("Service %s already exists", service_name)
-            vm = VM(vm=test)
-            if vm.is_template():  # Check if it's been converted already
-                self._log.warning("Service %s is a Template, "
-                                  "skipping configuration", service_name)
-                return vm
+            return VM(vm=test), None
+
+        # Find the template that matches the service definition
+        template = self.template_folder.traverse_path(config["template"])
+        if not template:
+            self._log.error("Could not find template '%s' for service '%s'",
+                            config["template"], service_name)
+            return None, None
+        self._log.info("Creating service '%s'", service_name)
+        vm = VM(name=vm_name, folder=folder,
+                resource_pool=self.server.get_pool(),
+                datastore=self.server.datastore, host=self.host)
+        return vm, vm.clone_async(template=template)
+
+    def _configure_service(self, vm, service_name, networks):
+        """
+        Configures a service that was cloned into a master folder.
+
+        :param vm: The service VM instance
+        :type vm: :class:`VM`
+        :param str service_name: Name of the service
+        :param list networks: Networks to configure the service with
+        """
+        if vm.is_template():  # Check if it's been converted already
+            self._log.warning("Service %s is a Template, "
+                              "skipping configuration", service_name)
+            return
+        config = self.services[service_name]
 
         # Resource configurations (minus storage currently)
         if "resource-config" in config:
@@ -323,7 +349,6 @@ class VsphereInterface(Interface):
         vm.create_snapshot("Start of Mastering",
                            "Beginning of Mastering phase for exercise %s",
                            self.metadata["name"])
-        return vm
 
     def _create_master_networks(self, net_type, default_create):
         """
@@ -387,13 +412,14 @@ class VsphereInterface(Interface):
             diff = int(num_nets - num_nics)
             self._log.debug("VM '%s' is deficient %d NICs, adding...",
                             vm.name, diff)
+            # Select NIC hardware
+            nic_model = ("vmxnet3" if vm.has_tools() else "e1000")
             # Add NICs to VM and pop them from the list of networks
+            new_nics = []
             for _ in range(diff):
-                # Select NIC hardware
-                nic_model = ("vmxnet3" if vm.has_tools() else "e1000")
                 net_name = nets.pop()
-                vm.add_nic(network=self.server.get_network(net_name),
-                           model=nic_model, summary=net_name)
+                new_nics.append((self.server.get_network(net_name), net_name))
+            vm.add_nics(new_nics, model=nic_model)
 
         # Edit the interfaces
         # (NOTE: any NICs added earlier shouldn't be affected by this)
@@ -437,7 +463,8 @@ class VsphereInterface(Interface):
         self._log.info("Finished deploying environment")
 
         # Output fully deployed environment tree to debugging
-        self._log.debug(format_structure(self.root_folder.enumerate()))
+        if self._log.isEnabledFor(logging.DEBUG):  # Skip walking the tree
+            self._log.debug(format_structure(self.root_folder.enumerate()))
 
     def _convert_and_verify(self, folder):
         """
@@ -449,6 +476,9 @@ class VsphereInterface(Interface):
         """
         self._log.debug("Converting Masters in folder '%s' to templates",
                         folder.name)
+        masters = []
+        guest_off = []  # Masters with a guest OS shutdown in progress
+        hard_off = []  # Masters to power off without the guest OS
         for item in folder.childEntity:
             if is_vm(item):
                 vm = VM(vm=item)
@@ -458,30 +488,60 @@ class VsphereInterface(Interface):
                     self._log.debug("Master '%s' is already a template",
                                     vm.name)
                     continue
+                masters.append(vm)
 
                 # Cleanly power off VM before converting to template
+                # The power offs of all the Masters in the folder run at once
                 if vm.powered_on():
-                    vm.change_state("off", attempt_guest=True)
-
-                # Take a snapshot to allow reverts to the start of the exercise
-                vm.create_snapshot("Start of exercise",
-                                   "Beginning of deployment phase, "
-                                   "post-master configuration")
-
-                # Convert Master instance to Template
-                vm.convert_template()
-                if not vm.is_template():
-                    self._log.error("Master '%s' did not convert to Template",
-                                    vm.name)
-                else:
-                    self._log.debug("Converted Master '%s' to Template",
-                                    vm.name)
+                    result = vm.change_state_async("off", attempt_guest=True)
+                    if isinstance(result, vim.Task):
+                        hard_off.append((vm, result))
+                    elif result:
+                        guest_off.append(vm)
+                    else:  # The guest shutdown couldn't be started
+                        hard_off.append((vm, None))
             elif is_folder(item):  # Recurse into sub-folders
                 self._convert_and_verify(item)
             else:
                 self._log.debug("Unknown item found while "
                                 "templatizing Masters: %s", str(item))
 
+        # Guest shutdowns don't have a task, so wait for the power state.
+        # Masters that are still on after the timeout are powered off.
+        still_on = wait_for_power_state([vm.get_vim_vm() for vm in guest_off],
+                                        vim.VirtualMachine.PowerState.poweredOff,
+                                        timeout=120)
+        for vm in guest_off:
+            if vm.get_vim_vm() in still_on:
+                self._log.warning("Guest shutdown of Master '%s' timed out, "
+                                  "powering it off", vm.name)
+                hard_off.append((vm, None))
+        hard_off = [(vm, task if task is not None else
+                     vm.change_state_async("off", attempt_guest=False))
+                    for vm, task in hard_off]
+        succeeded = wait_for_tasks_success([task for _, task in hard_off],
+                                           timeout=60 * len(hard_off))
+        for (vm, _), off in zip(hard_off, succeeded):
+            if not off:
+                self._log.error("Failed to power off Master '%s', it will "
+                                "not be converted to a Template", vm.name)
+                masters.remove(vm)
+
+        # Take a snapshot to allow reverts to the start of the exercise
+        wait_for_tasks([vm.create_snapshot_async("Start of exercise",
+                                                 "Beginning of deployment phase, "
+                                                 "post-master configuration")
+                        for vm in masters], timeout=60 * len(masters))
+
+        for vm in masters:
+            # Convert Master instance to Template
+            vm.convert_template()
+            if not vm.is_template():
+                self._log.error("Master '%s' did not convert to Template",
+                                vm.name)
+            else:
+                self._log.debug("Converted Master '%s' to Template", vm.name)
+
     def _deploy_parent_folder_gen(self, spec, parent, path):
         """
         Generates parent-type folder trees.
@@ -595,6 +655,8 @@ class VsphereInterface(Interface):
         :param str path: Folders path at the current level
         :param int instance: What instance of a base folder this is
         """
+        clones = []  # VM instances that are being cloned, with their networks
+        tasks = []  # The clone task of each instance
         # Iterate through the services
         for service_name, value in services.items():
             if not self._is_vsphere(value["service"]):
@@ -618,7 +680,7 @@ class VsphereInterface(Interface):
                                 "in this path:\n%s", value["service"], path)
                 continue  # Skip to the next service
 
-            # Clone the instances of the service from the master
+            # Start cloning the instances of the service from the master
             for i in range(num_instances):
                 instance_name = prefix + service_name + (" " + pad(i)
                                                          if num_instances > 1
@@ -626,12 +688,20 @@ class VsphereInterface(Interface):
                 vm = VM(name=instance_name, folder=parent,
                         resource_pool=self.server.get_pool(),
                         datastore=self.server.datastore, host=self.host)
-                if not vm.create(template=master.get_vim_vm()):
-                    self._log.error("Failed to create instance %s",
-                                    instance_name)
-                else:
-                    self._configure_nics(vm, value["networks"],
-                                         instance=instance)
+                clones.append((vm, value["networks"]))
+                tasks.append(vm.clone_async(template=master.get_vim_vm()))
+
+        # Wait for all of the clones in the folder at once, allowing each
+        # clone as long as it had when they were waited on one at a time.
+        # Clones still running after that are cancelled and reported.
+        for (vm, networks), new_vm in zip(
+                clones, wait_for_tasks(tasks, timeout=120 * len(tasks))):
+            if new_vm is None:
+                self._log.error("Failed to create instance %s: the clone "
+                                "failed or did not finish in time", vm.name)
+            else:
+                vm.bind(new_vm)
+                self._configure_nics(vm, networks, instance=instance)
 
     def _is_vsphere(self, service_name):
         """
@@ -717,6 +787,7 @@ class VsphereInterface(Interface):
                               recursive=True,
                               destroy_folders=True,
                               destroy_self=True)
+        self.server.clear_name_index()  # Forget the destroyed Masters
 
         # Cleanup networks
         if network_cleanup:
@@ -2,12 +2,14 @@
 
 import logging
 import sys
+from os import listdir
 from os.path import basename, exists, join, splitext
 
 from adles.args import parse_cli_args
 from adles.interfaces import PlatformInterface
 from adles.parser import check_syntax, parse_yaml
 from adles.utils import handle_keyboard_interrupt, setup_logging
+from adles.vsphere.vsphere_utils import VsphereException
 
 
 def run_cli():
@@ -34,7 +36,8 @@ def main(args) -> int:
 
     # Just validate syntax, no building of environment
     if command == 'validate':
-        if check_syntax(args.spec, args.validate_type) is None:
+        if check_syntax(args.spec, args.validate_type,
+                        fast_fail=args.fail_fast) is None:
             return 1
     # Build an environment using a specification
     elif command in ['deploy', 'masters', 'cleanup', 'package']:
@@ -73,30 +76,34 @@ def main(args) -> int:
             spec["metadata"]["infra-file"] = override
 
         # Instantiate the Interface and call functions for the specified phase
-        interface = PlatformInterface(infra=parse_yaml(
-            spec["metadata"]["infra-file"]), spec=spec)
-        if command == 'masters':
-            interface.create_masters()
-            logging.info("Finished Master creation for %s",
-                         spec["metadata"]["name"])
-        elif command == 'deploy':
-            interface.deploy_environment()
-            logging.info("Finished deployment of %s",
-                         spec["metadata"]["name"])
-        elif command == 'cleanup':
-            if args.cleanup_type == 'masters':
-                interface.cleanup_masters(args.cleanup_nets)
-            elif args.cleanup_type == 'environment':
-                interface.cleanup_environment(args.cleanup_nets)
-            logging.info("Finished %s cleanup of %s", args.cleanup_type,
-                         spec["metadata"]["name"])
-        else:
-            logging.error("INTERNAL ERROR -- Invalid command: %s", command)
+        try:
+            interface = PlatformInterface(infra=parse_yaml(
+                spec["metadata"]["infra-file"]), spec=spec)
+            if command == 'masters':
+                interface.create_masters()
+                logging.info("Finished Master creation for %s",
+                             spec["metadata"]["name"])
+            elif command == 'deploy':
+                interface.deploy_environment()
+                logging.info("Finished deployment of %s",
+                             spec["metadata"]["name"])
+            elif command == 'cleanup':
+                if args.cleanup_type == 'masters':
+                    interface.cleanup_masters(args.cleanup_nets)
+                elif args.cleanup_type == 'environment':
+                    interface.cleanup_environment(args.cleanup_nets)
+                logging.info("Finished %s cleanup of %s", args.cleanup_type,
+                             spec["metadata"]["name"])
+            else:
+                logging.error("INTERNAL ERROR -- Invalid command: %s", command)
+                return 1
+        except VsphereException as e:
+            logging.error("Error during %s of %s: %s", command,
+                          spec["metadata"]["name"], e)
             return 1
     # Show examples on commandline
     elif args.list_examples or args.print_example:
         from pkg_resources import Requirement, resource_filename
-        from os import listdir
         example_dir = resource_filename(Requirement.parse("ADLES"), "examples")
         # Filter non-YAML files from the listdir output
         examples = [x[:-5] for x in listdir(example_dir) if ".yaml" in x]
@@ -2,18 +2,66 @@ import ipaddress
 import logging
 import os
 import sys
+from copy import deepcopy
+from functools import lru_cache
 from io import TextIOWrapper
-from typing import Optional, Tuple
+from typing import Optional, Sequence, Tuple
 
 from yaml import YAMLError, load
 
 try:  # Attempt to use C-based YAML parser if it's available
-    from yaml import CLoader as Loader
+    from yaml import CSafeLoader as Loader
+    _LIBYAML = True
 except ImportError:  # Fallback to using pure Python YAML parser
-    from yaml import Loader  # noqa: T484
+    from yaml import SafeLoader as Loader  # noqa: T484
+    _LIBYAML = False
 
 from adles import utils
 
+# Keys that cause a warning or an error if missing from each part of a spec
+_METADATA_WARNINGS = ("description", "version", "folder-name")
+_METADATA_ERRORS = ("name", "prefix", "infra-file")
+_PROVISIONER_ERRORS = ("name", "file")
+_RESOURCES_ERRORS = ("lab", "resource")
+_SCORING_WARNINGS = ("ports", "protocols")
+_SCORING_ERRORS = ("criteria",)
+_VSPHERE_WARNINGS = ("port", "login-file", "datacenter",
+                     "datastore", "server-root", "vswitch")
+_VSPHERE_ERRORS = ("hostname", "template-folder")
+_THRESHOLD_ERRORS = ("folder", "service")
+_DOCKER_WARNINGS = ("url",)
+_REGISTRY_ERRORS = ("url", "login-file")
+_PACKAGE_METADATA_WARNINGS = ("name", "description", "version")
+_PACKAGE_METADATA_ERRORS = ("timestamp", "tag")
+_PACKAGE_CONTENTS_WARNINGS = ("infrastructure", "scoring", "results",
+                              "templates", "materials")
+_PACKAGE_CONTENTS_ERRORS = ("environment",)
+
+# Keys that define what a service is created from (at least one is required)
+_SERVICE_SOURCES = frozenset(("template", "image", "dockerfile", "compose-file"))
+
+# Types of networks that can be in a network specification
+_NETWORK_TYPES = ("unique-networks", "generic-networks")
+
+# Keys of a folder specification that aren't sub-folders
+_FOLDER_KEYWORDS = frozenset(("group", "master-group", "instances",
+                              "description", "enabled"))
+
+
+def _log_yaml_error(exc: YAMLError, filename: str) -> None:
+    """Logs a YAML parsing error, including where it occurred if known.
+
+    :param exc: The error raised by the YAML loader
+    :param filename: Name of the file that failed to parse"""
+    logging.critical("Could not parse YAML file %s", filename)
+    if hasattr(exc, 'problem_mark'):
+        # Tell user exactly where the syntax error is
+        mark = exc.problem_mark
+        logging.error("Error position: (%s:%s)",
+                      mark.line + 1, mark.column + 1)
+    else:
+        logging.error("Error: %s", exc)
+
 
 # PyYAML Reference: http://pyyaml.org/wiki/PyYAMLDocumentation
 def parse_yaml_file(file: TextIOWrapper) -> Optional[dict]:
@@ -25,15 +73,29 @@ def parse_yaml_file(file: TextIOWrapper) -> Optional[dict]:
         # Parses the YAML file into a dict
         return load(file, Loader=Loader)
     except YAMLError as exc:
-        logging.critical("Could not parse YAML file %s", file.name)
-        if hasattr(exc, 'problem_mark'):
-            # Tell user exactly where the syntax error is
-            mark = exc.problem_mark
-            logging.error("Error position: (%s:%s)",
-                          mark.line + 1, mark.column + 1)
-        else:
-            logging.error("Error: %s", exc)
-            return None
+        _log_yaml_error(exc, file.name)
+        return None
+
+
+@lru_cache(maxsize=32)
+def _load_yaml(filename: str, version: Tuple[int, int]) -> Optional[dict]:
+    """Loads a YAML file. The contents are cached until the file is modified.
+
+    :param filename: Name of YAML file to load
+    :param version: Modification time (in nanoseconds) and size of the file
+    :return: Parsed file contents"""
+    # Read the file in one go and let the loader decode the bytes itself
+    with open(filename, 'rb') as f:
+        return load(f.read(), Loader=Loader)
+
+
+@lru_cache(maxsize=1)
+def _log_yaml_loader() -> None:
+    """Logs if the pure Python YAML parser is used. Only logs once, when the
+    first file is parsed, since logging isn't set up yet at import time."""
+    if not _LIBYAML:
+        logging.debug("LibYAML is not available, "
+                      "using the pure Python YAML parser")
 
 
 # PyYAML Reference: http://pyyaml.org/wiki/PyYAMLDocumentation
@@ -42,28 +104,24 @@ def parse_yaml(filename: str) -> Optional[dict]:
 
     :param filename: Name of YAML file to parse
     :return: Parsed file contents"""
+    _log_yaml_loader()
     try:
-        # Enables use of stdin if '-' is specified
-        with sys.stdin if filename == '-' else open(filename) as f:
-            try:
-                # Parses the YAML file into a dict
-                return load(f, Loader=Loader)
-            except YAMLError as exc:
-                logging.critical("Could not parse YAML file %s", filename)
-                if hasattr(exc, 'problem_mark'):
-                    # Tell user exactly where the syntax error is
-                    mark = exc.problem_mark
-                    logging.error("Error position: (%s:%s)",
-                                  mark.line + 1, mark.column + 1)
-                else:
-                    logging.error("Error: %s", exc)
-                    return None
+        try:
+            if filename == '-':  # Enables use of stdin if '-' is specified
+                return load(sys.stdin.buffer.read(), Loader=Loader)
+            # Copy the cached contents so callers can't modify them
+            stat = os.stat(filename)
+            return deepcopy(_load_yaml(filename,
+                                       (stat.st_mtime_ns, stat.st_size)))
+        except YAMLError as exc:
+            _log_yaml_error(exc, filename)
+            return None
     except FileNotFoundError:
         logging.critical("Could not find YAML file for parsing: %s", filename)
         return None
 
 
-def _checker(value_list: list, source: str, data: dict, flag: str) -> int:
+def _checker(value_list: Sequence[str], source: str, data: dict, flag: str) -> int:
     """Checks if values in the list are in data (Syntax warnings or errors).
 
     :param value_list: List of values to check
@@ -71,19 +129,20 @@ def _checker(value_list: list, source: str, data: dict, flag: str) -> int:
     :param data: Data being checked
     :param flag: What to do if value not found ("warnings" | "errors")
     :return: Number of hits (warnings/errors)"""
-    num_hits = 0
-    for value in value_list:
-        if value not in data:
-            if flag == "warnings":
-                logging.warning("Missing %s in %s", value, source)
-            elif flag == "errors":
-                logging.error("Missing %s in %s", value, source)
-            else:
-                logging.error("Invalid flag for _checker: %s", flag)
-            num_hits += 1
-    if num_hits > 0:
-        logging.info("Total number of %s in %s: %d", flag, source, num_hits)
-    return num_hits
+    missing = [value for value in value_list if value not in data]
+    if not missing:
+        return 0
+    if flag == "warnings":
+        log = logging.warning
+    elif flag == "errors":
+        log = logging.error
+    else:
+        logging.error("Invalid flag for _checker: %s", flag)
+        return len(missing)
+    # Report all of the missing values in a single message
+    log("Missing %s in %s", ", ".join(missing), source)
+    logging.info("Total number of %s in %s: %d", flag, source, len(missing))
+    return len(missing)
 
 
 def _verify_exercise_metadata_syntax(metadata: dict) -> Tuple[int, int]:
@@ -91,10 +150,9 @@ def _verify_exercise_metadata_syntax(metadata: dict) -> Tuple[int, int]:
 
     :param metadata: metadata
     :return: Number of errors, Number of warnings"""
-    warnings = ["description", "version", "folder-name"]
-    errors = ["name", "prefix", "infra-file"]
-    num_warnings = _checker(warnings, "metadata", metadata, "warnings")
-    num_errors = _checker(errors, "metadata", metadata, "errors")
+    num_warnings = _checker(_METADATA_WARNINGS, "metadata", metadata,
+                            "warnings")
+    num_errors = _checker(_METADATA_ERRORS, "metadata", metadata, "errors")
 
     if "infra-file" in metadata:
         infra_file = metadata["infra-file"]
@@ -177,25 +235,23 @@ def _verify_services_syntax(services: dict) -> Tuple[int, int]:
     num_errors = 0
 
     for key, value in services.items():
-        if "network-interfaces" in value and \
-                not isinstance(value["network-interfaces"], list):
+        if not isinstance(value, dict):
+            logging.error("Invalid service definition: %s", key)
+            num_errors += 1
+            continue
+        if not isinstance(value.get("network-interfaces", []), list):
             logging.error("Network interfaces must be a list for "
                           "service %s", key)
             num_errors += 1
-        if "provisioner" in value:
-            num_errors += _checker(["name", "file"],
+        provisioner = value.get("provisioner")
+        if provisioner is not None:
+            num_errors += _checker(_PROVISIONER_ERRORS,
                                    "provisioner for service %s" % key,
-                                   value["provisioner"], "errors")
-        if "note" in value and not isinstance(value["note"], str):
+                                   provisioner, "errors")
+        if not isinstance(value.get("note", ""), str):
             logging.error("Note must be a string for service %s", key)
             num_errors += 1
-        if "template" in value:
-            pass
-        elif "image" in value or "dockerfile" in value:
-            pass
-        elif "compose-file" in value:
-            pass
-        else:
+        if value.keys().isdisjoint(_SERVICE_SOURCES):
             logging.error("Invalid service definition: %s", key)
             num_errors += 1
     return num_errors, num_warnings
@@ -206,10 +262,8 @@ def _verify_resources_syntax(resources: dict) -> Tuple[int, int]:
 
     :param dict resources: resources
     :return: Number of errors, Number of warnings"""
-    warnings = []
-    errors = ["lab", "resource"]
-    num_warnings = _checker(warnings, "resources", resources, "warnings")
-    num_errors = _checker(errors, "resources", resources, "errors")
+    num_warnings = 0
+    num_errors = _checker(_RESOURCES_ERRORS, "resources", resources, "errors")
     return num_errors, num_warnings
 
 
@@ -220,9 +274,8 @@ def _verify_networks_syntax(networks: dict) -> Tuple[int, int]:
     :return: Number of errors, Number of warnings"""
     num_warnings = 0
     num_errors = 0
-    net_types = ["unique-networks", "generic-networks"]
 
-    if not any(net in networks for net in net_types):
+    if not any(net in networks for net in _NETWORK_TYPES):
         logging.error("Network specification exists but is empty!")
         num_errors += 1
     else:
@@ -249,20 +302,17 @@ def _verify_network(name: str, network: dict) -> Tuple[int, int]:
             num_warnings += 1
         else:
             try:
-                subnet = ipaddress.ip_network(value["subnet"])
-            except ValueError as err:
+                invalid, private = _classify_subnet(value["subnet"])
+            except (TypeError, ValueError) as err:  # Unhashable, e.g. a list
                 logging.error("Invalid format for subnet '%s': %s",
                               str(value["subnet"]), str(err))
                 num_errors += 1
             else:
-                if subnet.is_reserved \
-                        or subnet.is_link_local \
-                        or subnet.is_multicast \
-                        or subnet.is_loopback:
+                if invalid:
                     logging.error("%s %s is in a invalid IP address space",
                                   name, key)
                     num_errors += 1
-                elif not subnet.is_private:
+                elif not private:
                     logging.warning("Non-private subnet used for %s %s",
                                     name, key)
                     num_warnings += 1
@@ -288,6 +338,21 @@ def _verify_network(name: str, network: dict) -> Tuple[int, int]:
     return num_errors, num_warnings
 
 
+@lru_cache(maxsize=256)
+def _classify_subnet(subnet: str) -> Tuple[bool, bool]:
+    """Classifies the IP address space of a subnet.
+    Specifications tend to reuse the same subnets, so results are cached.
+
+    :param subnet: The subnet, e.g. "192.168.0.0/24"
+    :return: If the subnet is in an invalid address space
+    (reserved, link-local, multicast or loopback), If it's private
+    :raises ValueError: If the subnet is not valid"""
+    network = ipaddress.ip_network(subnet)
+    invalid = network.is_reserved or network.is_link_local \
+        or network.is_multicast or network.is_loopback
+    return invalid, network.is_private
+
+
 def _verify_folders_syntax(folders: dict) -> Tuple[int, int]:
     """Verifies that the syntax for folders matches the specification.
 
@@ -295,61 +360,63 @@ def _verify_folders_syntax(folders: dict) -> Tuple[int, int]:
     :return: Number of errors, Number of warnings"""
     num_warnings = 0
     num_errors = 0
-    keywords = ["group", "master-group", "instances", "description", "enabled"]
-
-    for key, value in folders.items():
-        if key in keywords:
-            continue
-        if not isinstance(value, dict):
-            logging.error("Invalid configuration %s", str(key))
-            num_errors += 1
-            continue
-        # Check instances syntax, regardless of parent or base
-        if "instances" in value:
-            if not isinstance(value["instances"], int):
-                pass
-            elif "number" in value["instances"]:
-                if not isinstance(value["instances"]["number"], int):
-                    logging.error("Number of instances for folder '%s' "
-                                  "must be an Integer", key)
-                    num_errors += 1
-            elif "size-of" in value["instances"]:
-                pass
-            else:
-                logging.error("Must specify number of instances "
-                              "for folder '%s'", key)
-                num_errors += 1
 
-        # Check if parent or base
-        if "services" in value:  # It's a base folder
-            if "group" not in value:
-                logging.error("No group specified for folder '%s'", key)
+    # Walk the folder tree with a stack of the folders being checked,
+    # checking each folder's items in order before moving on to the next
+    stack = [iter(folders.items())]
+    while stack:
+        for key, value in stack[-1]:
+            if key in _FOLDER_KEYWORDS:
+                continue
+            if not isinstance(value, dict):
+                logging.error("Invalid configuration %s", str(key))
                 num_errors += 1
-            for skey, svalue in value["services"].items():
-                if "service" not in svalue:
-                    logging.error("Service %s is unnamed in folder '%s'",
-                                  skey, key)
+                continue
+            # Check instances syntax, regardless of parent or base
+            if "instances" in value:
+                if not isinstance(value["instances"], int):
+                    pass
+                elif "number" in value["instances"]:
+                    if not isinstance(value["instances"]["number"], int):
+                        logging.error("Number of instances for folder '%s' "
+                                      "must be an Integer", key)
+                        num_errors += 1
+                elif "size-of" in value["instances"]:
+                    pass
+                else:
+                    logging.error("Must specify number of instances "
+                                  "for folder '%s'", key)
                     num_errors += 1
-                if "networks" in svalue and \
-                        not isinstance(svalue["networks"], list):
-                    logging.error("Network specifications must be a list "
-                                  "for service '%s' "
-                                  "in folder '%s'", skey, key)
+
+            # Check if parent or base
+            if "services" in value:  # It's a base folder
+                if "group" not in value:
+                    logging.error("No group specified for folder '%s'", key)
                     num_errors += 1
-                if "scoring" in svalue:
-                    err, warn = _verify_scoring_syntax(skey, svalue["scoring"])
-                    num_errors += err
-                    num_warnings += warn
-        else:  # It's a parent folder
-            if not isinstance(value, dict):
-                logging.error("Could not verify syntax of folder '%s': "
-                              "'%s' is not a folder!",
-                              str(key), str(value))
-                num_errors += 1
-            else:
-                err, warn = _verify_folders_syntax(value)
-                num_errors += err
-                num_warnings += warn
+                for skey, svalue in value["services"].items():
+                    if not isinstance(svalue, dict):
+                        logging.error("Invalid configuration for service %s "
+                                      "in folder '%s'", skey, key)
+                        num_errors += 1
+                        continue
+                    if "service" not in svalue:
+                        logging.error("Service %s is unnamed in folder '%s'",
+                                      skey, key)
+                        num_errors += 1
+                    if not isinstance(svalue.get("networks", []), list):
+                        logging.error("Network specifications must be a list "
+                                      "for service '%s' "
+                                      "in folder '%s'", skey, key)
+                        num_errors += 1
+                    if "scoring" in svalue:
+                        err, warn = _verify_scoring_syntax(skey, svalue["scoring"])
+                        num_errors += err
+                        num_warnings += warn
+            else:  # It's a parent folder, check it before the rest
+                stack.append(iter(value.items()))
+                break
+        else:  # Finished checking the folder
+            stack.pop()
     return num_errors, num_warnings
 
 
@@ -360,11 +427,9 @@ def _verify_scoring_syntax(service_name: str, scoring: dict) -> Tuple[int, int]:
     scoring specification applies
     :param scoring: scoring parameters
     :return: Number of errors, Number of warnings"""
-    warnings = ["ports", "protocols"]
-    errors = ["criteria"]
-    num_warnings = _checker(warnings, "service %s" %
+    num_warnings = _checker(_SCORING_WARNINGS, "service %s" %
                             service_name, scoring, "warnings")
-    num_errors = _checker(errors, "service %s"
+    num_errors = _checker(_SCORING_ERRORS, "service %s"
                           % service_name, scoring, "errors")
     return num_errors, num_warnings
 
@@ -376,14 +441,13 @@ def verify_infra_syntax(infra: dict) -> Tuple[int, int]:
     :return: Number of errors, Number of warnings"""
     num_warnings = 0
     num_errors = 0
-    warnings = []
-    errors = []
+    warnings = ()
+    errors = ()
 
     for platform, config in infra.items():
         if platform == "vmware-vsphere":  # VMware vSphere configurations
-            warnings = ["port", "login-file", "datacenter",
-                        "datastore", "server-root", "vswitch"]
-            errors = ["hostname", "template-folder"]
+            warnings = _VSPHERE_WARNINGS
+            errors = _VSPHERE_ERRORS
             if "login-file" in config and \
                     utils.read_json(config["login-file"]) is None:
                 logging.error("Invalid vSphere infrastructure login-file: %s",
@@ -395,13 +459,13 @@ def verify_infra_syntax(infra: dict) -> Tuple[int, int]:
                               type(config["host-list"]))
                 num_errors += 1
             if "thresholds" in config:
-                num_errors += _checker(["folder", "service"], "infrastructure",
+                num_errors += _checker(_THRESHOLD_ERRORS, "infrastructure",
                                        config["thresholds"], "errors")
         elif platform == "docker":  # Docker configurations
-            warnings = ["url"]
-            errors = []
+            warnings = _DOCKER_WARNINGS
+            errors = ()
             if "registry" in config:
-                num_errors += _checker(["url", "login-file"], "infrastructure",
+                num_errors += _checker(_REGISTRY_ERRORS, "infrastructure",
                                        config["registry"], "errors")
         elif platform in ["cloud"]:
             logging.info("Platform %s is not yet implemented", platform)
@@ -414,36 +478,58 @@ def verify_infra_syntax(infra: dict) -> Tuple[int, int]:
     return num_errors, num_warnings
 
 
-def verify_exercise_syntax(spec: dict) -> Tuple[int, int]:
+# Sections of an exercise specification, with the function that verifies
+# each one and whether the section is required
+_EXERCISE_SECTIONS = (
+    ("metadata", _verify_exercise_metadata_syntax, True),
+    ("groups", _verify_groups_syntax, True),
+    ("services", _verify_services_syntax, True),
+    ("resources", _verify_resources_syntax, False),
+    ("networks", _verify_networks_syntax, True),
+    ("folders", _verify_folders_syntax, True),
+)
+# Top-level keys that aren't sections, but are part of the specification
+_EXERCISE_SPEC_FIELDS = ("spec-type", "spec-version")
+_EXERCISE_SECTION_NAMES = frozenset(
+    [key for key, _, _ in _EXERCISE_SECTIONS] + list(_EXERCISE_SPEC_FIELDS))
+
+
+def verify_exercise_syntax(spec: dict,
+                           fast_fail: bool = False) -> Tuple[int, int]:
     """Verifies the syntax of an environment specification.
 
     :param spec: Dictionary of environment specification
+    :param fast_fail: Stop at the first section with errors,
+    instead of reporting the errors in every section
     :return: Number of errors, Number of warnings"""
     num_warnings = 0
     num_errors = 0
-    funcs = {"metadata": _verify_exercise_metadata_syntax,
-             "groups": _verify_groups_syntax,
-             "services": _verify_services_syntax,
-             "resources": _verify_resources_syntax,
-             "networks": _verify_networks_syntax,
-             "folders": _verify_folders_syntax}
-    required = ["metadata", "groups", "services", "networks", "folders"]
-    optional = ["resources"]
-
-    for key, func in funcs.items():
-        if key not in spec:
-            if key in required:
+
+    if not isinstance(spec, dict):
+        logging.error("Specification must be a mapping of definitions, "
+                      "not a %s", type(spec).__name__)
+        return 1, num_warnings
+
+    for key, func, required in _EXERCISE_SECTIONS:
+        section = spec.get(key)
+        if section is None:
+            if required:
                 logging.error("Required definition %s was not found", key)
                 num_errors += 1
-            elif key in optional:
-                logging.info('Optional definition "%s" was not found', key)
             else:
-                logging.warning("Unknown definition found: %s", key)
-                num_warnings += 1
+                logging.info('Optional definition "%s" was not found', key)
         else:
-            err, warn = func(spec[key])
+            err, warn = func(section)
             num_errors += err
             num_warnings += warn
+        if fast_fail and num_errors:
+            return num_errors, num_warnings
+
+    # Catch misspelled section names, which would otherwise be silently ignored
+    unknown = [key for key in spec if key not in _EXERCISE_SECTION_NAMES]
+    for key in unknown:
+        logging.warning('Unknown definition "%s" will be ignored', key)
+    num_warnings += len(unknown)
     return num_errors, num_warnings
 
 
@@ -460,11 +546,9 @@ def verify_package_syntax(package: dict) -> Tuple[int, int]:
         logging.error("Metadata section not specified for package!")
         num_errors += 1
     else:
-        metadata_warnings = ["name", "description", "version"]
-        metadata_errors = ["timestamp", "tag"]
-        num_warnings += _checker(metadata_warnings, "metadata",
+        num_warnings += _checker(_PACKAGE_METADATA_WARNINGS, "metadata",
                                  package["metadata"], "warnings")
-        num_errors += _checker(metadata_errors, "metadata",
+        num_errors += _checker(_PACKAGE_METADATA_ERRORS, "metadata",
                                package["metadata"], "errors")
 
     # Check syntax of contents section
@@ -472,23 +556,22 @@ def verify_package_syntax(package: dict) -> Tuple[int, int]:
         logging.error("Contents section not specified for package!")
         num_errors += 1
     else:
-        content_warnings = ["infrastructure", "scoring", "results",
-                            "templates", "materials"]
-        content_errors = ["environment"]
-        num_warnings += _checker(content_warnings, "contents",
+        num_warnings += _checker(_PACKAGE_CONTENTS_WARNINGS, "contents",
                                  package["contents"], "warnings")
-        num_errors += _checker(content_errors, "contents",
+        num_errors += _checker(_PACKAGE_CONTENTS_ERRORS, "contents",
                                package["contents"], "errors")
     return num_errors, num_warnings
 
 
-def check_syntax(specfile_path: str,
-                 spec_type: str = "exercise") -> Optional[dict]:
+def check_syntax(specfile_path: str, spec_type: str = "exercise",
+                 fast_fail: bool = False) -> Optional[dict]:
     """Checks the syntax of a specification file.
 
     :param specfile_path: Path to the YAML specification file
     :param spec_type: Type of specification file
     (exercise | package | infra)
+    :param fast_fail: Stop checking an exercise specification
+    at the first section with errors
     :return: The specification """
     spec = parse_yaml(specfile_path)
     if spec is None:
@@ -499,7 +582,7 @@ def check_syntax(specfile_path: str,
                  os.path.basename(specfile_path))
     if spec_type == "exercise":
         logging.info("Checking exercise syntax...")
-        errors, warnings = verify_exercise_syntax(spec)
+        errors, warnings = verify_exercise_syntax(spec, fast_fail)
     elif spec_type == "package":
         logging.info("Checking package syntax...")
         errors, warnings = verify_package_syntax(spec)
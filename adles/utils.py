@@ -3,9 +3,16 @@ import logging
 import logging.handlers
 import os
 import sys
-import timeit
+from copy import deepcopy
+from datetime import date
+from functools import lru_cache, wraps
+from getpass import getuser
+from platform import node, python_version, release, system
+from time import perf_counter
 from typing import Callable, List, Optional, Tuple
 
+from adles.__about__ import __version__ as adles_version
+
 try:
     import tqdm
     TQDM = True
@@ -33,16 +40,21 @@ def time_execution(func: Callable) -> Callable:
 
     :param func: The function to time execution of
     :return: The decorated function"""
+    name = func.__name__
+
+    @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = timeit.default_timer()
+        start_time = perf_counter()
         ret = func(*args, **kwargs)
-        end_time = timeit.default_timer()
-        logging.debug("Elapsed time for %s: %f seconds", func.__name__,
-                      float(end_time - start_time))
+        logging.debug("Elapsed time for %s: %f seconds",
+                      name, perf_counter() - start_time)
         return ret
     return wrapper
 
 
+_SIZE_UNITS = ('bytes', 'KB', 'MB', 'GB', 'TB')
+
+
 # From: list_dc_datastore_info in pyvmomi-community-samples
 # http://stackoverflow.com/questions/1094841/
 def sizeof_fmt(num: float) -> str:
@@ -55,11 +67,10 @@ def sizeof_fmt(num: float) -> str:
 
     :param num: Robot-readable file size in bytes
     :return: Human-readable file size"""
-    for item in ['bytes', 'KB', 'MB', 'GB']:
-        if num < 1024.0:
-            return "%3.1f%s" % (num, item)
-        num /= 1024.0
-    return "%3.1f%s" % (num, 'TB')
+    # Every unit is 2^10 times the last, so the unit follows from the bit length
+    whole = int(num)
+    unit = min((whole.bit_length() - 1) // 10, 4) if whole > 0 else 0
+    return "%3.1f%s" % (num / (1 << (10 * unit)), _SIZE_UNITS[unit])
 
 
 def pad(value: int, length: int = 2) -> str:
@@ -74,7 +85,19 @@ def pad(value: int, length: int = 2) -> str:
     :param value: integer value to pad
     :param length: Length to pad to
     :return: string of padded value"""
-    return "{0:0>{width}}".format(value, width=length)
+    return str(value).rjust(length, '0')
+
+
+@lru_cache(maxsize=32)
+def _load_json(filename: str, version: Tuple[int, int]) -> dict:
+    """Loads a JSON file. The contents are cached until the file is modified.
+
+    :param filename: Path to JSON file to load
+    :param version: Modification time (in nanoseconds) and size of the file
+    :return: Contents of the JSON file"""
+    # Let the JSON decoder read the raw bytes instead of decoding them first
+    with open(filename, 'rb') as json_file:
+        return json.loads(json_file.read())
 
 
 def read_json(filename: str) -> Optional[dict]:
@@ -83,8 +106,9 @@ def read_json(filename: str) -> Optional[dict]:
     :param filename: Path to JSON file to read
     :return: Contents of the JSON file"""
     try:
-        with open(filename) as json_file:
-            return json.load(fp=json_file)
+        # Copy the cached contents so callers can't modify them
+        stat = os.stat(filename)
+        return deepcopy(_load_json(filename, (stat.st_mtime_ns, stat.st_size)))
     except ValueError as message:
         logging.error("Syntax Error in JSON file '%s': %s",
                       filename, str(message))
@@ -138,22 +162,23 @@ def setup_logging(filename: str, colors: bool = True,
     :param server: SysLog server to forward logs to
     :param show_progress: Show live status as operations progress"""
 
-    # Prepend spaces to separate logs from previous runs
-    with open(filename, 'a', encoding='utf-8') as logfile:
-        logfile.write(2 * '\n')
-
     # Format log output so it's human readable yet verbose
     base_format = "%(asctime)s %(levelname)-8s %(name)-7s %(message)s"
     time_format = "%H:%M:%S"  # %Y-%m-%d
     formatter = logging.Formatter(fmt=base_format, datefmt=time_format)
 
-    # Configures the base logger to append to a file
-    logging.basicConfig(level=logging.DEBUG, format=base_format,
-                        datefmt=time_format, filename=filename, filemode='a')
-
     # Get the global root logger
     # Handlers added to this will propagate to all loggers
     logger = logging.root
+    logger.setLevel(logging.DEBUG)
+
+    # Configures the base logger to append to a file
+    logfile = logging.FileHandler(filename, mode='a', encoding='utf-8')
+    logfile.setLevel(logging.DEBUG)
+    logfile.setFormatter(formatter)
+    # Prepend spaces to separate logs from previous runs
+    logfile.stream.write(2 * '\n')
+    logger.addHandler(logfile)
 
     # Configure logging to a SysLog server
     # This prevents students from simply deleting the log files
@@ -167,10 +192,6 @@ def setup_logging(filename: str, colors: bool = True,
 
     # Record system information to aid in auditing and debugging
     # We do this before configuring console output to reduce verbosity
-    from getpass import getuser
-    from platform import python_version, system, release, node
-    from datetime import date
-    from adles import __version__ as adles_version
     logging.debug("Initialized logging, saving logs to %s", filename)
     logging.debug("Date             %s", str(date.today()))
     logging.debug("OS               %s", str(system() + " " + release()))
@@ -232,8 +253,8 @@ def user_input(prompt: str, obj_name: str, func: Callable) -> Tuple[object, str]
             logging.info("Found %s: %s", obj_name, item.name)
             return item, item_name
         else:
-            print("Couldn't find a %s with name %s. Perhaps try another? "  # noqa: T001
-                  % (obj_name, item_name))
+            logging.warning("Couldn't find a %s with name %s. "
+                            "Perhaps try another?", obj_name, item_name)
 
 
 @handle_keyboard_interrupt
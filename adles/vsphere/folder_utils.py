@@ -1,9 +1,25 @@
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 
 from adles.utils import split_path
-from adles.vsphere.vsphere_utils import is_folder, is_vm
+from adles.vsphere.vsphere_utils import get_names, retrieve_properties, \
+    wait_for_tasks_success
+
+# Maximum number of calls to start tasks that are made at the same time
+MAX_PARALLEL_CALLS = 16
+
+# Number of seconds allowed for each task in a batch of cleanup tasks
+CLEANUP_TASK_TIMEOUT = 120.0
+
+# Prefixes used by enumerate_folder to display the power state of VMs
+POWER_STATES = {
+    vim.VirtualMachine.PowerState.poweredOn: '* ON  ',
+    vim.VirtualMachine.PowerState.poweredOff: '* OFF ',
+    vim.VirtualMachine.PowerState.suspended: '* SUS ',
+}
 
 
 def create_folder(folder, folder_name):
@@ -54,29 +70,106 @@ def cleanup(folder, vm_prefix='', folder_prefix='', recursive=False,
     :param bool destroy_self: Destroy the folder specified
     """
     logging.debug("Cleaning folder '%s'", folder.name)
-    from adles.vsphere.vm import VM
-
-    # TODO: progress bar
-    # pbar = tqdm.tqdm(folder.childEntity, desc="Cleaning folder",
-    #                  unit="Items", clear=True)
-    for item in folder.childEntity:
-        # Handle VMs
-        if is_vm(item) and str(item.name).startswith(vm_prefix):
-            VM(vm=item).destroy()  # Delete the VM from the Datastore
-
-        # Handle folders
-        elif is_folder(item) and str(item.name).startswith(folder_prefix):
-            if destroy_folders:  # Destroys folder and ALL of it's sub-objects
-                cleanup(item, destroy_folders=True, destroy_self=True)
-            elif recursive:  # Simply recurses to find more items
-                cleanup(item, vm_prefix=vm_prefix,
-                        folder_prefix=folder_prefix, recursive=True)
+    tree = _collect_folder_tree(folder, recursive or destroy_folders,
+                                vm_properties=["runtime.powerState"])
+    vms, folders = _cleanup_targets(tree, folder, vm_prefix, folder_prefix,
+                                    recursive, destroy_folders)
+
+    # Destroy all of the VMs at once, then wait for them to finish
+    powered_on = [vm for vm in vms if tree[vm].get("runtime.powerState")
+                  == vim.VirtualMachine.PowerState.poweredOn]
+    if powered_on:
+        logging.debug("Powering off %d VMs", len(powered_on))
+        _report_failures("power off", powered_on, tree, wait_for_tasks_success(
+            _start_tasks(lambda vm: vm.PowerOffVM_Task(), powered_on),
+            timeout=CLEANUP_TASK_TIMEOUT * len(powered_on)))
+    if vms:
+        logging.debug("Destroying %d VMs", len(vms))
+        # Delete the VMs from the Datastore
+        _report_failures("destroy", vms, tree, wait_for_tasks_success(
+            _start_tasks(lambda vm: vm.Destroy_Task(), vms),
+            timeout=CLEANUP_TASK_TIMEOUT * len(vms)))
 
     # Note: UnregisterAndDestroy does NOT delete VM files off the datastore
     # Only use if folder is already empty!
     if destroy_self:
-        logging.debug("Destroying folder: '%s'", folder.name)
-        folder.UnregisterAndDestroy_Task().wait()
+        folders = [folder]  # Destroys any remaining sub-folders as well
+    if folders:
+        logging.debug("Destroying folders: %s",
+                      ", ".join(tree[f]["name"] for f in folders))
+        _report_failures("destroy", folders, tree, wait_for_tasks_success(
+            _start_tasks(lambda f: f.UnregisterAndDestroy_Task(), folders),
+            timeout=CLEANUP_TASK_TIMEOUT * len(folders)))
+
+
+def _report_failures(action, items, tree, succeeded):
+    """
+    Logs the items that a cleanup action failed or timed out on.
+
+    :param str action: Action that was performed on the items
+    :param list items: Items the action was performed on
+    :param dict tree: Properties of the items, including their names
+    :param list(bool) succeeded: If the action succeeded for each item
+    """
+    failed = [tree[item].get("name", str(item))
+              for item, ok in zip(items, succeeded) if not ok]
+    if failed:
+        logging.error("Failed to %s %d of %d objects: %s", action,
+                      len(failed), len(items), ", ".join(failed))
+
+
+def _start_tasks(func, items):
+    """
+    Starts a task for each item. Each call is a separate round-trip to the
+    server, so the calls are made in parallel.
+
+    :param func: Function that starts a task for an item
+    :param list items: Items to start tasks for
+    :return: The tasks that were started, in the same order as the items
+    :rtype: list(vim.Task)
+    """
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CALLS) as executor:
+        return list(executor.map(func, items))
+
+
+def _cleanup_targets(tree, folder, vm_prefix, folder_prefix, recursive,
+                     destroy_folders):
+    """
+    Finds the VMs and folders that :func:`cleanup` should destroy
+    in a tree collected by :func:`_collect_folder_tree`.
+
+    :param dict tree: Collected properties of the folder tree
+    :param folder: Folder being cleaned
+    :type folder: vim.Folder
+    :param str vm_prefix: Only destroy VMs with names starting with the prefix
+    :param str folder_prefix: Only destroy or search in folders with names
+    starting with the prefix
+    :param bool recursive: Recursively descend into any sub-folders
+    :param bool destroy_folders: Destroy folders in addition to VMs
+    :return: VMs to destroy, and the top-most folders to destroy
+    :rtype: tuple(list(vim.VirtualMachine), list(vim.Folder))
+    """
+    vms = []
+    folders = []
+    stack = [folder]
+    while stack:
+        for item in tree[stack.pop()].get("childEntity", []):
+            name = tree.get(item, {}).get("name", "")
+            # Handle VMs
+            if isinstance(item, vim.VirtualMachine) \
+                    and name.startswith(vm_prefix):
+                vms.append(item)
+
+            # Handle folders
+            elif isinstance(item, vim.Folder) \
+                    and name.startswith(folder_prefix):
+                if destroy_folders:  # Destroys folder and ALL of it's items
+                    v, _ = _retrieve_from_tree(tree, item, '', '', True)
+                    vms.extend(v)
+                    folders.append(item)
+                elif recursive:  # Simply descends to find more items
+                    stack.append(item)
+    return vms, folders
 
 
 def get_in_folder(folder, name, recursive=False, vimtype=None):
@@ -98,10 +191,11 @@ def get_in_folder(folder, name, recursive=False, vimtype=None):
 
     # Get first found of type if can't find in folder or name isn't specified
     if item is None:
-        if len(folder.childEntity) > 0 and vimtype is None:
-            return folder.childEntity[0]
-        elif len(folder.childEntity) > 0:
-            for i in folder.childEntity:
+        children = folder.childEntity  # Each access is a call to the server
+        if len(children) > 0 and vimtype is None:
+            return children[0]
+        elif len(children) > 0:
+            for i in children:
                 if isinstance(i, vimtype):
                     return i
             logging.error("Could not find item of type '%s' in folder '%s'",
@@ -124,19 +218,33 @@ def find_in_folder(folder, name, recursive=False, vimtype=None):
     :rtype: vimtype or None
     """
     # NOTE: Convert to lowercase for case-insensitive comparisons
-    item_name = name.lower()
-    found = None
-    for item in folder.childEntity:
-        # Check if the name matches
-        if hasattr(item, 'name') and item.name.lower() == item_name:
-            if vimtype is not None and not isinstance(item, vimtype):
-                continue
-            found = item
-        elif recursive and is_folder(item):  # Recurse into sub-folders
-            found = find_in_folder(item, name=item_name,
-                                   recursive=recursive, vimtype=vimtype)
-        if found is not None:
-            return found
+    tree = _collect_folder_tree(folder, recursive=recursive)
+    return _find_in_tree(tree, folder, name.lower(), recursive, vimtype)
+
+
+def _find_in_tree(tree, folder, item_name, recursive, vimtype):
+    """
+    Finds an object in a folder tree collected by :func:`_collect_folder_tree`.
+
+    :param dict tree: Collected properties of the folder tree
+    :param folder: Folder to search in
+    :type folder: vim.Folder
+    :param str item_name: Lowercase name of the object to find
+    :param bool recursive: Recurse into sub-folders
+    :param vimtype: Type of object to search for
+    :return: The object found
+    :rtype: vimtype or None
+    """
+    folders = deque([folder])  # Search breadth-first
+    while folders:
+        for item in tree[folders.popleft()].get("childEntity", []):
+            # Check if the name matches
+            name = tree.get(item, {}).get("name")
+            if name is not None and name.lower() == item_name:
+                if vimtype is None or isinstance(item, vimtype):
+                    return item
+            elif recursive and isinstance(item, vim.Folder):
+                folders.append(item)  # Search sub-folders later
     return None
 
 
@@ -160,14 +268,14 @@ def traverse_path(folder, path, lookup_root=None, generate=False):
 
     # Check if root of the path is in the folder
     # This is to allow relative paths to be used if lookup_root is defined
-    folder_items = [x.name.lower() for x in folder.childEntity
-                    if hasattr(x, 'name')]
-    if len(folder_path) > 0 and folder_path[0] not in folder_items:
+    children = _child_folders(folder)
+    if len(folder_path) > 0 and folder_path[0] not in children:
         if lookup_root is not None:
             logging.debug("Root %s not in folder %s, looking up...",
                           folder_path[0], folder.name)
             # Lookup the path root on server
             folder = lookup_root.get_folder(folder_path.pop(0))
+            children = None
         else:
             logging.error("Could not find root '%s' "
                           "of path '%s' in folder '%s'",
@@ -176,21 +284,15 @@ def traverse_path(folder, path, lookup_root=None, generate=False):
 
     current = folder  # Start with the defined folder
     for f in folder_path:  # Try each folder name in the path
-        found = None
-
-        # Iterate through items in the current folder
-        for item in current.childEntity:
-            # If Folder is part of path
-            if is_folder(item) and item.name.lower() == f:
-                found = item  # This is the next folder in the path
-                # Break to outer loop to check this folder
-                # for the next part of the path
-                break
+        if children is None:
+            children = _child_folders(current)
+        found = children.get(f)  # The next folder in the path
         if generate and found is None:  # Can't find the folder, so create it
             logging.warning("Generating folder %s in path", f)
-            create_folder(folder, f)  # Generate the folder
-        elif found is not None:
+            found = create_folder(current, f)  # Generate the folder
+        if found is not None:
             current = found
+            children = None  # Check this folder for the next part of the path
 
     # Since the split had a basename, look for an item with matching name
     if name != '':
@@ -199,6 +301,19 @@ def traverse_path(folder, path, lookup_root=None, generate=False):
         return current
 
 
+def _child_folders(folder):
+    """
+    Gets the sub-folders of a folder.
+
+    :param folder: Folder to get the sub-folders of
+    :type folder: vim.Folder
+    :return: The sub-folders, keyed by their lowercase names
+    :rtype: dict(str, vim.Folder)
+    """
+    folders = [c for c in folder.childEntity if isinstance(c, vim.Folder)]
+    return {name.lower(): f for f, name in get_names(folders).items()}
+
+
 def enumerate_folder(folder, recursive=True, power_status=False):
     """
     Enumerates a folder structure and returns the result.
@@ -211,31 +326,46 @@ def enumerate_folder(folder, recursive=True, power_status=False):
     :return: The nested python object with the enumerated folder structure
     :rtype: list(list, str)
     """
+    vm_properties = ["runtime.powerState"] if power_status else []
+    tree = _collect_folder_tree(folder, recursive, vm_properties)
+    return _enumerate_tree(tree, folder, recursive, power_status)
+
+
+def _enumerate_tree(tree, folder, recursive, power_status):
+    """
+    Enumerates a folder tree collected by :func:`_collect_folder_tree`.
+
+    :param dict tree: Collected properties of the folder tree
+    :param folder: Folder to enumerate
+    :type folder: vim.Folder
+    :param bool recursive: Whether to recurse into any sub-folders
+    :param bool power_status: Display the power state of the VMs in the folder
+    :return: The nested python object with the enumerated folder structure
+    :rtype: tuple(str, list)
+    """
     children = []
-    for item in folder.childEntity:
-        if is_folder(item):
+    for item in tree[folder].get("childEntity", []):
+        props = tree.get(item, {})
+        if isinstance(item, vim.Folder):
             if recursive:  # Recurse into sub-folders and append the sub-tree
-                children.append(enumerate_folder(item, recursive))
+                children.append(_enumerate_tree(tree, item, recursive,
+                                                power_status))
             else:  # Don't recurse, just append the folder
-                children.append('- ' + item.name)
-        elif is_vm(item):
+                children.append('- ' + props["name"])
+        elif isinstance(item, vim.VirtualMachine):
             if power_status:
-                if item.runtime.powerState == \
-                        vim.VirtualMachine.PowerState.poweredOn:
-                    children.append('* ON  ' + item.name)
-                elif item.runtime.powerState == \
-                        vim.VirtualMachine.PowerState.poweredOff:
-                    children.append('* OFF ' + item.name)
-                elif item.runtime.powerState == \
-                        vim.VirtualMachine.PowerState.suspended:
-                    children.append('* SUS ' + item.name)
+                state = POWER_STATES.get(props.get("runtime.powerState"))
+                if state is not None:
+                    children.append(state + props["name"])
                 else:
-                    logging.error("Invalid power state for VM: %s", item.name)
+                    logging.error("Invalid power state for VM: %s",
+                                  props["name"])
             else:
-                children.append('* ' + item.name)
+                children.append('* ' + props["name"])
         else:
             children.append("UNKNOWN ITEM: %s" % str(item))
-    return '+ ' + folder.name, children  # Return tuple of parent and children
+    # Return tuple of parent and children
+    return '+ ' + tree[folder]["name"], children
 
 
 # Similar to: https://docs.python.org/3/library/pprint.html
@@ -250,21 +380,32 @@ def format_structure(structure, indent=4, _depth=0):
     :return: Formatted string of the folder structure
     :rtype: str
     """
-    fmat = ""
-    newline = '\n' + str(_depth * str(indent * ' '))
+    out = []
+    _format_into(structure, out, indent, _depth)
+    return "".join(out)
+
+
+def _format_into(structure, out, indent, depth):
+    """
+    Appends the formatted lines of a folder structure to a list.
 
+    :param structure: structure to format
+    :type structure: tuple(list(str), str)
+    :param list out: List that formatted lines are appended to
+    :param int indent: Number of spaces to indent each level of nesting
+    :param int depth: Current depth
+    """
     if isinstance(structure, tuple):
-        fmat += newline + str(structure[0])
-        fmat += format_structure(structure[1], indent, _depth + 1)
+        out.append('\n' + ' ' * (indent * depth) + str(structure[0]))
+        _format_into(structure[1], out, indent, depth + 1)
     elif isinstance(structure, list):
         for item in structure:
-            fmat += format_structure(item, indent, _depth)
+            _format_into(item, out, indent, depth)
     elif isinstance(structure, str):
-        fmat += newline + structure
+        out.append('\n' + ' ' * (indent * depth) + structure)
     else:
         logging.error("Unexpected type in folder structure for item '%s': %s",
                       str(structure), type(structure))
-    return fmat
 
 
 def retrieve_items(folder, vm_prefix='', folder_prefix='', recursive=False):
@@ -280,25 +421,73 @@ def retrieve_items(folder, vm_prefix='', folder_prefix='', recursive=False):
 
     .. warning:: This will recurse regardless of folder prefix!
 
+    :return: The VMs and folders found in the folder
+    :rtype: tuple(list(vim.VirtualMachine), list(vim.Folder))
+    """
+    tree = _collect_folder_tree(folder, recursive)
+    return _retrieve_from_tree(tree, folder, vm_prefix, folder_prefix,
+                               recursive)
+
+
+def _retrieve_from_tree(tree, folder, vm_prefix, folder_prefix, recursive):
+    """
+    Retrieves VMs and folders from a tree collected by
+    :func:`_collect_folder_tree`.
+
+    :param dict tree: Collected properties of the folder tree
+    :param folder: Folder to begin search in
+    :type folder: vim.Folder
+    :param str vm_prefix: VM prefix to search for
+    :param str folder_prefix: Folder prefix to search for
+    :param bool recursive: Recursively descend into sub-folders
     :return: The VMs and folders found in the folder
     :rtype: tuple(list(vim.VirtualMachine), list(vim.Folder))
     """
     vms = []
     folders = []
-
-    for item in folder.childEntity:  # Iterate through all items in the folder
-        if is_vm(item) and str(item.name).startswith(vm_prefix):
-            vms.append(item)  # Add matching vm to the list
-        elif is_folder(item):
-            if str(item.name).startswith(folder_prefix):
-                folders.append(item)  # Add matching folder to the list
-            if recursive:  # Recurse into sub-folders
-                v, f = retrieve_items(item, vm_prefix, folder_prefix, recursive)
-                vms.extend(v)
-                folders.extend(f)
+    stack = [folder]
+    while stack:
+        for item in tree[stack.pop()].get("childEntity", []):
+            name = tree.get(item, {}).get("name", "")
+            if isinstance(item, vim.VirtualMachine) \
+                    and name.startswith(vm_prefix):
+                vms.append(item)  # Add matching vm to the list
+            elif isinstance(item, vim.Folder):
+                if name.startswith(folder_prefix):
+                    folders.append(item)  # Add matching folder to the list
+                if recursive:  # Descend into sub-folders
+                    stack.append(item)
     return vms, folders
 
 
+def _collect_folder_tree(folder, recursive=True, vm_properties=()):
+    """
+    Collects the names and children of a folder and everything in it
+    using a single PropertyCollector query, instead of fetching the
+    properties of each item in the tree one at a time.
+
+    :param folder: Folder at the root of the tree
+    :type folder: vim.Folder
+    :param bool recursive: Collect the contents of sub-folders
+    :param vm_properties: Additional properties to collect for VMs
+    :type vm_properties: list(str)
+    :return: Properties of the folder and every item under it
+    :rtype: dict(vim.ManagedEntity, dict(str, value))
+    """
+    pc = vmodl.query.PropertyCollector
+    traversal = pc.TraversalSpec(name="folderTraversal", type=vim.Folder,
+                                 path="childEntity", skip=False)
+    if recursive:  # Follow the childEntity of every folder that's reached
+        traversal.selectSet = [pc.SelectionSpec(name="folderTraversal")]
+    properties = {vim.ManagedEntity: ["name"],
+                  vim.Folder: ["name", "childEntity"]}
+    if vm_properties:
+        properties[vim.VirtualMachine] = ["name"] + list(vm_properties)
+    return retrieve_properties(
+        [pc.ObjectSpec(obj=folder, skip=False, selectSet=[traversal])],
+        properties)
+
+
 def move_into(folder, entity_list):
     """
     Moves a list of managed entities into the named folder.
@@ -2,6 +2,12 @@ import logging
 
 from pyVmomi import vim
 
+from adles.vsphere.network_utils import create_portgroup
+
+# Attributes of a host's network information that hold each type of object
+_NET_INFO_ATTRS = {"portgroup": "portgroup", "vswitch": "vswitch",
+                   "proxyswitch": "proxySwitch", "vnic": "vnic", "pnic": "pnic"}
+
 
 class Host:
     """ Represents an ESXi host in a VMware vSphere environment. """
@@ -15,6 +21,7 @@ class Host:
         self.host = host
         self.name = str(host.name)
         self.config = host.config
+        self.network_system = host.configManager.networkSystem
 
     def reboot(self, force=False):
         """
@@ -69,8 +76,7 @@ class Host:
         vswitch_spec = vim.host.VirtualSwitch.Specification()
         vswitch_spec.numPorts = int(num_ports)
         try:
-            self.host.configManager.networkSystem.AddVirtualSwitch(name,
-                                                                   vswitch_spec)
+            self.network_system.AddVirtualSwitch(name, vswitch_spec)
         except vim.fault.AlreadyExists:
             self._log.error("vSwitch %s already exists on host %s",
                             name, self.name)
@@ -84,25 +90,8 @@ class Host:
         :param int vlan: VLAN ID of the port group
         :param bool promiscuous: Put portgroup in promiscuous mode
         """
-        self._log.debug("Creating PortGroup %s on vSwitch %s on host %s;"
-                        " VLAN: %d; Promiscuous: %s",
-                        name, vswitch_name, self.name, vlan, promiscuous)
-        policy = vim.host.NetworkPolicy()
-        policy.security = vim.host.NetworkPolicy.SecurityPolicy()
-        policy.security.allowPromiscuous = bool(promiscuous)
-        policy.security.macChanges = False
-        policy.security.forgedTransmits = False
-        spec = vim.host.PortGroup.Specification(name=name, vlanId=int(vlan),
-                                                vswitchName=vswitch_name,
-                                                policy=policy)
-        try:
-            self.host.configManager.networkSystem.AddPortGroup(spec)
-        except vim.fault.AlreadyExists:
-            self._log.error("PortGroup %s already exists on host %s",
-                            name, self.name)
-        except vim.fault.NotFound:
-            self._log.error("vSwitch %s does not exist on host %s",
-                            vswitch_name, self.name)
+        create_portgroup(name=name, host=self.host, vswitch_name=vswitch_name,
+                         vlan=vlan, promiscuous=promiscuous)
 
     def delete_network(self, name, network_type):
         """
@@ -116,9 +105,9 @@ class Host:
                        network_type, name, self.name)
         try:
             if network_type.lower() == "vswitch":
-                self.host.configManager.networkSystem.RemoveVirtualSwitch(name)
+                self.network_system.RemoveVirtualSwitch(name)
             elif network_type.lower() == "portgroup":
-                self.host.configManager.networkSystem.RemovePortGroup(name)
+                self.network_system.RemovePortGroup(name)
         except vim.fault.NotFound:
             self._log.error("Tried to remove %s '%s' that does not exist "
                             "from host '%s'",
@@ -193,22 +182,13 @@ class Host:
         :rtype: list(vimtype) or None
         """
         if refresh:  # Pick up recent changes
-            self.host.configManager.networkSystem.RefreshNetworkSystem()
-        net_type = object_type.lower()
-        if net_type == "portgroup":
-            objects = self.host.configManager.networkSystem.networkInfo.portgroup
-        elif net_type == "vswitch":
-            objects = self.host.configManager.networkSystem.networkInfo.vswitch
-        elif net_type == "proxyswitch":
-            objects = self.host.configManager.networkSystem.networkInfo.proxySwitch
-        elif net_type == "vnic ":
-            objects = self.host.configManager.networkSystem.networkInfo.vnic
-        elif net_type == "pnic ":
-            objects = self.host.configManager.networkSystem.networkInfo.pnic
-        else:
+            self.network_system.RefreshNetworkSystem()
+        attr = _NET_INFO_ATTRS.get(object_type.lower())
+        if attr is None:
             self._log.error("Invalid type %s for get_net_objs", object_type)
             return None
-        return list(objects)
+        network_info = self.network_system.networkInfo
+        return list(getattr(network_info, attr))
 
     def __str__(self):
         return str(self.name)
@@ -1,10 +1,35 @@
 import logging
 import os
+import re
+from getpass import getpass, getuser
 
 from pyVmomi import vim
 
-from adles import utils
+from adles.utils import sizeof_fmt
 from adles.vsphere.folder_utils import find_in_folder
+from adles.vsphere.vsphere_utils import wait_for_power_state, \
+    wait_for_tasks_success
+
+# Names of snapshot delta disks (e.g. "vm-000001.vmdk")
+SNAPSHOT_DISK = re.compile(r'0000\d\d')
+
+# Names of the methods that change a VM's power state, by state
+_POWER_OPS = {"on": "PowerOnVM_Task", "off": "PowerOffVM_Task",
+              "reset": "ResetVM_Task", "suspend": "SuspendVM_Task"}
+
+# VMware Tools statuses that allow guest operations
+_TOOLS_WORKING = ("toolsOK", "toolsOld")
+
+# Power state a VM ends up in after a guest OS operation, by state
+GUEST_POWER_STATES = {"shutdown": vim.VirtualMachine.PowerState.poweredOff,
+                      "off": vim.VirtualMachine.PowerState.poweredOff,
+                      "standby": vim.VirtualMachine.PowerState.suspended,
+                      "suspend": vim.VirtualMachine.PowerState.suspended}
+
+# Names of the guest OS operations that change a VM's power state, by state
+_GUEST_OPS = {"shutdown": "ShutdownGuest", "off": "ShutdownGuest",
+              "reboot": "RebootGuest", "reset": "RebootGuest",
+              "standby": "StandbyGuest", "suspend": "StandbyGuest"}
 
 
 # Docs: https://goo.gl/CRhYEX
@@ -51,7 +76,7 @@ class VM:
 
     def create(self, template=None, cpus=None, cores=None, memory=None,
                max_consoles=None, version=None, firmware='efi',
-               datastore_path=None):
+               datastore_path=None, progress=None):
         """Creates a Virtual Machine.
         :param vim.VirtualMachine template: Template VM to clone
         :param int cpus: Number of processors
@@ -62,17 +87,13 @@ class VM:
         [default: highest host supports]
         :param str firmware: Firmware to emulate for the VM (efi | bios)
         :param str datastore_path: Path to existing VM files on datastore
+        :param progress: Function called with the percentage of the clone
+        that's complete (int) as it progresses
         :return: If the creation was successful
         :rtype: bool
         """
         if template is not None:  # Use a template to create the VM
-            self._log.debug("Creating VM '%s' by cloning %s",
-                            self.name, template.name)
-            clonespec = vim.vm.CloneSpec()
-            clonespec.location = vim.vm.RelocateSpec(pool=self.resource_pool,
-                                                     datastore=self.datastore)
-            if not template.CloneVM_Task(folder=self.folder, name=self.name,
-                                         spec=clonespec).wait(120):
+            if not self.clone_async(template).wait(120, progress=progress):
                 self._log.error("Error cloning VM %s", self.name)
                 return False
         else:  # Generate the specification for and create the new VM
@@ -101,14 +122,11 @@ class VM:
                 self._log.error("Error creating VM %s", self.name)
                 return False
 
-        self._vm = find_in_folder(self.folder, self.name,
-                                  vimtype=vim.VirtualMachine)
-        if not self._vm:
+        vm = find_in_folder(self.folder, self.name, vimtype=vim.VirtualMachine)
+        if not vm:
             self._log.error("Failed to make VM %s", self.name)
             return False
-        self.network = self._vm.network
-        self.runtime = self._vm.runtime
-        self.summary = self._vm.summary
+        self.bind(vm)
         if template is not None:  # Edit resources for a clone if specified
             self.edit_resources(cpus=cpus, cores=cores, memory=memory,
                                 max_consoles=max_consoles)
@@ -116,63 +134,103 @@ class VM:
         self._log.debug("Created VM %s", self.name)
         return True
 
+    def clone_async(self, template):
+        """Starts cloning a template into a new VM without waiting for it.
+        Pass the result of the task to :meth:`bind` once it finishes.
+        :param vim.VirtualMachine template: Template VM to clone
+        :return: The clone task
+        :rtype: vim.Task
+        """
+        self._log.debug("Creating VM '%s' by cloning %s",
+                        self.name, template.name)
+        clonespec = vim.vm.CloneSpec()
+        clonespec.location = vim.vm.RelocateSpec(pool=self.resource_pool,
+                                                 datastore=self.datastore)
+        return template.CloneVM_Task(folder=self.folder, name=self.name,
+                                     spec=clonespec)
+
+    def bind(self, vm):
+        """Binds the instance to a VM that was created for it.
+        :param vm: The created VM
+        :type vm: vim.VirtualMachine
+        """
+        self._vm = vm
+        self.network = vm.network
+        self.runtime = vm.runtime
+        self.summary = vm.summary
+
     def destroy(self):
         """Destroys the VM."""
         self._log.debug("Destroying VM %s", self.name)
-        if self.powered_on():
-            self.change_state("off")
+        if self.powered_on() and not self.change_state("off"):
+            # Force it off if the guest OS didn't shut down in time
+            self.change_state("off", attempt_guest=False)
         self._vm.Destroy_Task().wait()
 
-    def change_state(self, state, attempt_guest=True):
+    def change_state(self, state, attempt_guest=True, timeout=120.0):
         """Generic power state change that uses guest OS operations if available.
+        Waits until the VM has changed state, including for guest operations.
         :param str state: State to change to (on | off | reset | suspend)
         :param bool attempt_guest: Attempt to use guest operations
+        :param float timeout: Number of seconds to wait for a guest
+        operation to shut down or suspend the VM
         :return: If state change succeeded
         :rtype: bool
         """
+        task = self.change_state_async(state, attempt_guest)
+        if isinstance(task, vim.Task):
+            return wait_for_tasks_success([task])[0]
+        power_state = GUEST_POWER_STATES.get(state.lower())
+        if task and power_state is not None:  # Guest operation was started
+            if wait_for_power_state([self._vm], power_state, timeout):
+                self._log.error("VM '%s' did not change state to '%s' "
+                                "within %s seconds", self.name, state, timeout)
+                return False
+        return task
+
+    def change_state_async(self, state, attempt_guest=True):
+        """Starts a power state change without waiting for it to complete.
+        Guest OS operations are used if available.
+        :param str state: State to change to (on | off | reset | suspend)
+        :param bool attempt_guest: Attempt to use guest operations
+        :return: The task performing the power operation, or if the
+        guest operation was successfully started
+        :rtype: vim.Task or bool
+        """
         state = state.lower()  # Convert to lowercase for comparisons
-        if self.is_template():
+        # Each access of the summary is a call to the server, so get it once
+        summary = self._vm.summary
+        if summary.config.template:
             self._log.error("VM '%s' is a Template, so state "
                             "cannot be changed to '%s'",
                             self.name, state)
+            return False
         # Can't power on using guest ops
-        elif attempt_guest and self.has_tools() and state != "on":
-            if self._vm.summary.guest.toolsStatus == "toolsNotInstalled":
-                self._log.error("Cannot change a VM's guest power state "
-                                "without VMware Tools!")
-                return False
-            elif state == "shutdown" or state == "off":
-                task = self._vm.ShutdownGuest()
-            elif state == "reboot" or state == "reset":
-                task = self._vm.RebootGuest()
-            elif state == "standby" or state == "suspend":
-                task = self._vm.StandbyGuest()
-            else:
+        elif attempt_guest and state != "on" \
+                and summary.guest.toolsStatus in _TOOLS_WORKING:
+            operation = _GUEST_OPS.get(state)
+            if operation is None:
                 self._log.error("Invalid guest_state argument: %s", state)
                 return False
             self._log.debug("Changing guest power state of VM %s to: '%s'",
                             self.name, state)
+            # Guest operations don't return a task, they're just started
             try:
-                task.wait()
+                getattr(self._vm, operation)()
             except vim.fault.ToolsUnavailable:
                 self._log.error("Can't change guest state of '%s': "
                                 "Tools aren't running", self.name)
+                return False
+            return True
         else:
-            if state == "on":
-                task = self._vm.PowerOnVM_Task()
-            elif state == "off":
-                task = self._vm.PowerOffVM_Task()
-            elif state == "reset":
-                task = self._vm.ResetVM_Task()
-            elif state == "suspend":
-                task = self._vm.SuspendVM_Task()
-            else:
+            operation = _POWER_OPS.get(state)
+            if operation is None:
                 self._log.error("Invalid state arg %s for VM %s",
                                 state, self.name)
                 return False
             self._log.debug("Changing power state of VM %s to: '%s'",
                             self.name, state)
-            return bool(task.wait())
+            return getattr(self._vm, operation)()
 
     def edit_resources(self, cpus=None, cores=None,
                        memory=None, max_consoles=None):
@@ -250,18 +308,15 @@ class VM:
         -1 if not
         :rtype: int
         """
-        from os.path import basename
-        prog_name = basename(program_path)
+        prog_name = os.path.basename(program_path)
         if not self.has_tools():
             self._log.error("Cannot execute program %s in VM %s: "
                             "VMware Tools is not running",
                             prog_name, self.name)
             return -1
         if username is None:
-            from getpass import getuser
             username = getuser()
         if password is None:
-            from getpass import getpass
             password = getpass("Enter password of user %s to "
                                "execute program %s on VM %s"
                                % (username, prog_name, self.name))
@@ -285,16 +340,15 @@ class VM:
         :return: Human-readable disk usage of the snapshots
         :rtype: str
         """
-        from re import search
         disk_list = self._vm.layoutEx.file
         size = 0
         for disk in disk_list:
             if disk.type == 'snapshotData':
                 size += disk.size
-            ss_disk = search(r'0000\d\d', disk.name)
+            ss_disk = SNAPSHOT_DISK.search(disk.name)
             if ss_disk:
                 size += disk.size
-        return utils.sizeof_fmt(size)
+        return sizeof_fmt(size)
 
     def create_snapshot(self, name, description='', memory=False, quiesce=True):
         """Creates a snapshot of the VM.
@@ -303,11 +357,24 @@ class VM:
         :param bool memory: Memory dump of the VM is included in the snapshot
         :param bool quiesce: Quiesce VM disks (Requires VMware Tools)
         """
+        task = self.create_snapshot_async(name, description, memory, quiesce)
+        if not task.wait():
+            self._log.error("Failed to take snapshot of VM %s", self.name)
+
+    def create_snapshot_async(self, name, description='',
+                              memory=False, quiesce=True):
+        """Starts creating a snapshot of the VM without waiting for it.
+        :param str name: Name of the snapshot
+        :param str description: Text description of the snapshot
+        :param bool memory: Memory dump of the VM is included in the snapshot
+        :param bool quiesce: Quiesce VM disks (Requires VMware Tools)
+        :return: The snapshot task
+        :rtype: vim.Task
+        """
         self._log.info("Creating snapshot '%s' of VM '%s'", name, self.name)
-        if not self._vm.CreateSnapshot_Task(name=name, description=description,
+        return self._vm.CreateSnapshot_Task(name=name, description=description,
                                             memory=bool(memory),
-                                            quiesce=quiesce).wait():
-            self._log.error("Failed to take snapshot of VM %s", self.name)
+                                            quiesce=quiesce)
 
     def revert_to_snapshot(self, snapshot):
         """Reverts VM to the named snapshot.
@@ -358,6 +425,33 @@ class VM:
         `Read this for more details:
         <http://rickardnobel.se/vmxnet3-vs-e1000e-and-e1000-part-1/>`_
         """
+        spec = self._nic_spec(network, summary, model)
+        self._edit(vim.vm.ConfigSpec(deviceChange=[spec]))  # Apply change to VM
+
+    def add_nics(self, nics, model="e1000"):
+        """Adds multiple NICs to the VM with a single reconfiguration.
+        :param nics: Network to attach each NIC to and its
+        human-readable device info
+        :type nics: list(tuple(vim.Network, str))
+        :param str model: Model of virtual network adapter,
+        see :meth:`add_nic` for the options
+        """
+        specs = []
+        for key, (network, summary) in enumerate(nics, start=1):
+            spec = self._nic_spec(network, summary, model)
+            spec.device.key = -key  # Temporary key to tell new devices apart
+            specs.append(spec)
+        if specs:
+            self._edit(vim.vm.ConfigSpec(deviceChange=specs))
+
+    def _nic_spec(self, network, summary, model):
+        """Creates the specification for adding a NIC to the VM.
+        :param vim.Network network: Network to attach NIC to
+        :param str summary: Human-readable device info
+        :param str model: Model of virtual network adapter
+        :return: The device specification
+        :rtype: vim.vm.device.VirtualDeviceSpec
+        """
         if not isinstance(network, vim.Network):
             self._log.error("Invalid network type when adding vNIC "
                             "to VM '%s': %s", self.name, type(network).__name__)
@@ -412,7 +506,7 @@ class VM:
         spec.device.connectable.allowGuestControl = True
         spec.device.connectable.connected = True
         spec.device.connectable.status = 'untried'
-        self._edit(vim.vm.ConfigSpec(deviceChange=[spec]))  # Apply change to VM
+        return spec
 
     def edit_nic(self, nic_id, network=None, summary=None):
         """Edits a vNIC based on it's number.
@@ -650,9 +744,10 @@ class VM:
         :return: The HDD device
         :rtype: vim.vm.device.VirtualDisk or None
         """
+        name = name.lower()
         for dev in self._vm.config.hardware.device:
             if isinstance(dev, vim.vm.device.VirtualDisk) and \
-                    dev.deviceInfo.label.lower() == name.lower():
+                    dev.deviceInfo.label.lower() == name:
                 return dev
         return None
 
@@ -676,8 +771,9 @@ class VM:
         :return: The vNIC found
         :rtype: vim.vm.device.VirtualEthernetCard or None
         """
+        label = name.lower()
         for dev in self._vm.config.hardware.device:
-            if is_vnic(dev) and dev.deviceInfo.label.lower() == name.lower():
+            if is_vnic(dev) and dev.deviceInfo.label.lower() == label:
                 return dev
         self._log.debug("Could not find vNIC '%s' on '%s'", name, self.name)
         return None
@@ -731,13 +827,18 @@ class VM:
         :return: Nested List of vim.Snapshot objects
         :rtype: list(vim.Snapshot) or None
         """
-        local_snap = []
-        for snap in snap_tree:
-            local_snap.append(snap)
-        for snap in snap_tree:
-            recurse_snap = self._get_snapshots_recursive(snap.childSnapshotList)
-            if recurse_snap:
-                local_snap.extend(recurse_snap)
+        # Walk the tree with a stack of the snapshot lists being descended,
+        # listing all of a snapshot's children before any of their children
+        local_snap = list(snap_tree)
+        stack = [iter(snap_tree)]
+        while stack:
+            for snap in stack[-1]:
+                children = snap.childSnapshotList
+                local_snap.extend(children)
+                stack.append(iter(children))
+                break
+            else:
+                stack.pop()
         return local_snap
 
     def get_snapshot_info(self, name=None):
@@ -772,13 +873,14 @@ class VM:
         info_string = "\n"
         summary = self._vm.summary  # https://goo.gl/KJRrqS
         config = self._vm.config    # https://goo.gl/xFdCby
+        guest = self._vm.guest  # Fetched once, each access calls the server
         info_string += "Name          : %s\n" % self.name
         info_string += "Status        : %s\n" % str(summary.overallStatus)
         info_string += "Power State   : %s\n" % summary.runtime.powerState
-        if self._vm.guest:
-            info_string += "Guest State   : %s\n" % self._vm.guest.guestState
+        if guest:
+            info_string += "Guest State   : %s\n" % guest.guestState
         info_string += "Last modified : %s\n" \
-                       % str(self._vm.config.modified)  # datetime object
+                       % str(config.modified)  # datetime object
         if hasattr(summary.runtime, 'cleanPowerOff'):
             info_string += "Clean poweroff: %s\n" % \
                            summary.runtime.cleanPowerOff
@@ -800,13 +902,11 @@ class VM:
         if detailed:
             info_string += "Config Path   : %s\n" % summary.config.vmPathName
         info_string += "Folder:       : %s\n" % self._vm.parent.name
-        if self._vm.guest:
-            info_string += "IP            : %s\n" % self._vm.guest.ipAddress
-            info_string += "Hostname:     : %s\n" % self._vm.guest.hostName
-            info_string += "Tools status  : %s\n" % \
-                           self._vm.guest.toolsRunningStatus
-            info_string += "Tools version : %s\n" % \
-                           self._vm.guest.toolsVersionStatus2
+        if guest:
+            info_string += "IP            : %s\n" % guest.ipAddress
+            info_string += "Hostname:     : %s\n" % guest.hostName
+            info_string += "Tools status  : %s\n" % guest.toolsRunningStatus
+            info_string += "Tools version : %s\n" % guest.toolsVersionStatus2
         if vnics:
             vm_nics = self.get_nics()
             for num, vnic in zip(range(1, len(vm_nics) + 1), vm_nics):
@@ -824,10 +924,10 @@ class VM:
                            summary.runtime.question.text
         if summary.config.annotation:
             info_string += "Annotation    : %s\n" % summary.config.annotation
-        if snapshot and self._vm.snapshot and hasattr(self._vm.snapshot,
-                                                      'currentSnapshot'):
+        snapshot_info = self._vm.snapshot if snapshot else None
+        if snapshot_info and snapshot_info.currentSnapshot:
             info_string += "Current Snapshot: %s\n" % \
-                           self._vm.snapshot.currentSnapshot.config.name
+                           snapshot_info.currentSnapshot.config.name
             info_string += "Disk usage of all snapshots: %s\n" % \
                            self.snapshot_disk_usage()
         if detailed and summary.runtime:
@@ -852,8 +952,7 @@ class VM:
         :return: If tools are installed and working
         :rtype: bool
         """
-        tools = self._vm.summary.guest.toolsStatus
-        return True if tools == "toolsOK" or tools == "toolsOld" else False
+        return self._vm.summary.guest.toolsStatus in _TOOLS_WORKING
 
     def powered_on(self):
         """Determines if a VM is powered on.
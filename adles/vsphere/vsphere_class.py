@@ -1,9 +1,12 @@
 import logging
+from atexit import register
+from getpass import getpass
 
 from pyVim.connect import Disconnect, SmartConnect, SmartConnectNoSSL
 from pyVmomi import vim, vmodl
 
-from adles.vsphere.vsphere_utils import VsphereException
+from adles.vsphere.vsphere_utils import VsphereException, get_content, \
+    get_names, install_vim_extensions, retrieve_properties
 
 
 # TODO: separate connection logic from init, put in a ".connect()" method
@@ -32,6 +35,7 @@ class Vsphere(object):
         :raises LookupError: if a datacenter or datastore cannot be found
         """
         self._log = logging.getLogger('Vsphere')
+        install_vim_extensions()  # Enables task.wait(), datastore.get_info()
         self._log.debug("Initializing Vsphere\nDatacenter: %s"
                         "\tDatastore: %s\tSSL: %s",
                         datacenter, datastore, use_ssl)
@@ -39,7 +43,6 @@ class Vsphere(object):
         if username is None:
             username = input("Enter username for vSphere: ")
         if password is None:
-            from getpass import getpass
             password = getpass("Enter password for %s: " % username)
         if hostname is None:
             hostname = input("Enter hostname for vSphere: ")
@@ -60,7 +63,6 @@ class Vsphere(object):
             raise VsphereException("Timed out connecting to vSphere") from None
 
         # Ensure connection to server is closed on program exit
-        from atexit import register
         register(Disconnect, self._server)
 
         self._log.info("Connected to vSphere host %s:%d", hostname, port)
@@ -70,10 +72,12 @@ class Vsphere(object):
         self.username = username
         self.hostname = hostname
         self.port = port
-        self.content = self._server.RetrieveContent()
+        self.content = get_content(self._server)  # Cached per connection
         self.auth = self.content.authorizationManager
         self.user_dir = self.content.userDirectory
         self.search_index = self.content.searchIndex
+        # Objects of a type in a container by lowercase name, see get_by_name
+        self._name_index = {}
 
         self.datacenter = self.get_item(vim.Datacenter, name=datacenter)
         if not self.datacenter:
@@ -129,17 +133,14 @@ class Vsphere(object):
         :rtype: list
         """
         contain = (self.content.rootFolder if not container else container)
-        con_view = self.content.viewManager.CreateContainerView(
-            contain, vimtypes, recursive)
-        returns = []
-        for item in con_view.view:
-            if name:
-                if hasattr(item, 'name') and item.name.lower() == name.lower():
-                    returns.append(func(item))
-            else:
-                returns.append(func(item))
-        con_view.Destroy()
-        return returns
+        if name:
+            name = name.lower()
+            return [func(item) for item, item_name
+                    in self._collect_names(contain, vimtypes, recursive)
+                    if item_name is not None and item_name.lower() == name]
+        else:
+            return [func(item)
+                    for item in self.get_objs(contain, vimtypes, recursive)]
 
     def set_entity_permissions(self, entity, permission):
         """
@@ -259,17 +260,20 @@ class Vsphere(object):
         :rtype: str
         """
         about = self.content.about
-        info_string = "\n"
-        info_string += "Host address: %s:%d\n" % (self.hostname, self.port)
-        info_string += "Datacenter  : %s\n" % self.datacenter.name
-        info_string += "Datastore   : %s\n" % self.datastore.name
-        info_string += "Full name   : %s\n" % about.fullName
-        info_string += "Vendor      : %s\n" % about.vendor
-        info_string += "Version     : %s\n" % about.version
-        info_string += "API type    : %s\n" % about.apiType
-        info_string += "API version : %s\n" % about.apiVersion
-        info_string += "OS type     : %s" % about.osType
-        return info_string
+        return ("\n"
+                "Host address: %s:%d\n"
+                "Datacenter  : %s\n"
+                "Datastore   : %s\n"
+                "Full name   : %s\n"
+                "Vendor      : %s\n"
+                "Version     : %s\n"
+                "API type    : %s\n"
+                "API version : %s\n"
+                "OS type     : %s"
+                % (self.hostname, self.port, self.datacenter.name,
+                   self.datastore.name, about.fullName, about.vendor,
+                   about.version, about.apiType, about.apiVersion,
+                   about.osType))
 
     def get_folder(self, folder_name=None):
         """
@@ -280,7 +284,7 @@ class Vsphere(object):
         :rtype: vim.Folder
         """
         if folder_name:  # Try to find the named folder in the datacenter
-            return self.get_obj(self.datacenter, [vim.Folder], folder_name)
+            return self.get_by_name(vim.Folder, folder_name, self.datacenter)
         else:  # Default to the VM folder in the datacenter
             # Reference: pyvmomi/docs/vim/Datacenter.rst
             self._log.warning("Could not find folder '%s' in Datacenter '%s', "
@@ -296,7 +300,7 @@ class Vsphere(object):
         :return: The VM found
         :rtype: vim.VirtualMachine or None
         """
-        return self.get_item(vim.VirtualMachine, vm_name)
+        return self.get_by_name(vim.VirtualMachine, vm_name)
 
     def get_network(self, network_name, distributed=False):
         """
@@ -308,12 +312,11 @@ class Vsphere(object):
         :rtype: vim.Network or vim.dvs.DistributedVirtualPortgroup or None
         """
         if not distributed:
-            return self.get_obj(container=self.datacenter.networkFolder,
-                                vimtypes=[vim.Network],
-                                name=str(network_name), recursive=True)
+            return self.get_by_name(vim.Network, str(network_name),
+                                    self.datacenter.networkFolder)
         else:
-            return self.get_item(vim.dvs.DistributedVirtualPortgroup,
-                                 network_name)
+            return self.get_by_name(vim.dvs.DistributedVirtualPortgroup,
+                                    str(network_name))
 
     def get_host(self, host_name=None):
         """
@@ -389,16 +392,12 @@ class Vsphere(object):
         :return: Object found with the specified name
         :rtype: vimtype or None
         """
-        con_view = self.content.viewManager.CreateContainerView(container,
-                                                                vimtypes,
-                                                                recursive)
-        obj = None
-        for item in con_view.view:
-            if item.name.lower() == name.lower():
-                obj = item
-                break
-        con_view.Destroy()
-        return obj
+        name = name.lower()
+        for item, item_name in self._collect_names(container, vimtypes,
+                                                   recursive):
+            if item_name is not None and item_name.lower() == name:
+                return item
+        return None
 
     # From: https://github.com/sijis/pyvmomi-examples/vmutils.py
     def get_objs(self, container, vimtypes, recursive=True):
@@ -411,14 +410,98 @@ class Vsphere(object):
         :return: All vimtype objects found
         :rtype: list(vimtype) or None
         """
-        objs = []
         con_view = self.content.viewManager.CreateContainerView(container,
                                                                 vimtypes,
                                                                 recursive)
-        for item in con_view.view:
-            objs.append(item)
-        con_view.Destroy()
-        return objs
+        try:
+            return list(con_view.view)
+        finally:
+            con_view.Destroy()
+
+    def _collect_names(self, container, vimtypes, recursive=True):
+        """
+        Gets the names of all vim objects of the given types in a container.
+        The names are retrieved in a single query, and the view used to
+        find the objects is destroyed as soon as the query is complete.
+
+        :param container: Container to search in
+        :param list vimtypes: Objects to search for
+        :param bool recursive: Recursively search for the objects
+        :return: The objects found and their names
+        :rtype: list(tuple(vimtype, str))
+        """
+        con_view = self.content.viewManager.CreateContainerView(container,
+                                                                vimtypes,
+                                                                recursive)
+        pc = vmodl.query.PropertyCollector
+        traversal = pc.TraversalSpec(name="viewTraversal",
+                                     type=vim.view.ContainerView,
+                                     path="view", skip=False)
+        try:
+            props = retrieve_properties(
+                [pc.ObjectSpec(obj=con_view, skip=True,
+                               selectSet=[traversal])],
+                {vimtype: ["name"] for vimtype in vimtypes},
+                self.content.propertyCollector)
+        finally:
+            con_view.Destroy()
+        return [(obj, prop.get("name")) for obj, prop in props.items()]
+
+    def get_by_name(self, vimtype, name, container=None):
+        """
+        Finds a named vim object of the specified type using a cached index
+        of the names of all objects of that type in the container.
+        The index is built with a single query the first time it's used,
+        and rebuilt if the name isn't found in it or the object found
+        has since been renamed or destroyed.
+
+        :param vimtype: Type of the object
+        :type vimtype: vimtype
+        :param str name: Name of the object
+        :param container: Container to search in
+        [default: vCenter server content root folder]
+        :return: The object found
+        :rtype: vimtype or None
+        """
+        contain = (self.content.rootFolder if not container else container)
+        name = name.lower()
+        key = (contain, vimtype)
+        index = self._name_index.get(key)
+        found = index.get(name) if index is not None else None
+        if found is not None and not self._has_name(found, name):
+            found = None  # Renamed or destroyed since the index was built
+        if found is None:  # Pick up new objects
+            index = {}
+            for item, item_name in self._collect_names(contain, [vimtype]):
+                if item_name is not None:
+                    index.setdefault(item_name.lower(), item)
+            self._name_index[key] = index
+            found = index.get(name)
+        return found
+
+    @staticmethod
+    def _has_name(obj, name):
+        """
+        Checks if a vim object still exists and has a name.
+
+        :param obj: Object to check
+        :type obj: vim.ManagedEntity
+        :param str name: Lowercase name the object should have
+        :return: If the object's current name matches
+        :rtype: bool
+        """
+        try:
+            current = get_names([obj]).get(obj)
+        except vmodl.fault.ManagedObjectNotFound:
+            return False
+        return current is not None and current.lower() == name
+
+    def clear_name_index(self):
+        """
+        Clears the cached indices used by :meth:`get_by_name`.
+        Call this after objects have been renamed or destroyed.
+        """
+        self._name_index.clear()
 
     def get_item(self, vimtype, name=None, container=None, recursive=True):
         """
@@ -10,15 +10,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import tqdm
 from humanfriendly.prompts import prompt_for_choice, prompt_for_confirmation
+from pyVmomi import vim
 
 from adles.scripts.script_base import Script
 from adles.utils import default_prompt, pad
 from adles.vsphere.folder_utils import format_structure
-from adles.vsphere.vm import VM
-from adles.vsphere.vsphere_utils import is_vm, make_vsphere, resolve_path
+from adles.vsphere.vm import GUEST_POWER_STATES, VM
+from adles.vsphere.vsphere_utils import is_vm, make_vsphere, resolve_path, \
+    wait_for_power_state, wait_for_tasks
 
 
 class VsphereScript(Script):
@@ -26,7 +29,18 @@ class VsphereScript(Script):
 
     def __init__(self, server_filename=None):
         super(VsphereScript, self).__init__()
-        self.server = make_vsphere(filename=server_filename)
+        self._server_filename = server_filename
+        self._server = None
+
+    @property
+    def server(self):
+        """Connection to vSphere, which is only made when first needed.
+
+        :rtype: :class:`Vsphere`
+        """
+        if self._server is None:
+            self._server = make_vsphere(filename=self._server_filename)
+        return self._server
 
 
 class CleanupVms(VsphereScript):
@@ -41,10 +55,16 @@ class CleanupVms(VsphereScript):
                                                "that has the VMs/folders "
                                                "you want to destroy")
 
+            # Enumerate the folder in the background while the user answers
+            executor = ThreadPoolExecutor(max_workers=1)
+            structure = executor.submit(folder.enumerate, recursive=True,
+                                        power_status=True)
+            executor.shutdown(wait=False)
+
             # Display folder structure
             if prompt_for_confirmation("Display the folder structure? "):
-                self._log.info("Folder structure: \n%s", format_structure(
-                    folder.enumerate(recursive=True, power_status=True)))
+                self._log.info("Folder structure: \n%s",
+                               format_structure(structure.result()))
 
             # Prompt user to configure destruction options
             print("Answer the following questions to configure the cleanup")  # noqa: T001
@@ -149,7 +169,8 @@ class CloneVms(VsphereScript):
                 for i in range(len(v)):
                     names.append(input("Enter base name for VM %d: " % i))
             else:
-                names = list(map(lambda x: x.name, v))  # Same names as sources
+                # Same names as sources (VM caches its name, so no lookups)
+                names = [x.name for x in v]
             vm_names.extend(names)
 
         create_in, create_in_name = resolve_path(self.server, "folder",
@@ -190,7 +211,10 @@ class CloneVms(VsphereScript):
 
                     new_vm = VM(name=vm_name, folder=f,
                                 resource_pool=pool, datastore=datastore)
-                    new_vm.create(template=vm.get_vim_vm())
+                    new_vm.create(
+                        template=vm.get_vim_vm(),
+                        progress=lambda pct, label=name:
+                        pbar.set_postfix_str("%s %d%%" % (label, pct)))
                     pbar.update()
 
 
@@ -216,12 +240,18 @@ class VmPower(VsphereScript):
                 self._log.info("Folder structure: \n%s", format_structure(
                     folder.enumerate(recursive=True, power_status=True)))
             if prompt_for_confirmation("Continue? ", default=True):
-                pbar = tqdm.tqdm(vms, unit="VMs",
-                                 desc="Performing power operation " + operation)
-                for vm in pbar:
-                    pbar.set_postfix_str(vm.name)
-                    vm.change_state(operation, attempt_guest)
-                pbar.close()
+                # Start all of the power operations, then wait on them at once
+                results = [vm.change_state_async(operation, attempt_guest)
+                           for vm in vms]
+                tasks = [r for r in results if isinstance(r, vim.Task)]
+                # Guest operations don't have a task to wait on
+                guest = [vm for vm, r in zip(vms, results) if r is True]
+                with tqdm.tqdm(total=len(tasks) + len(guest), unit="VMs",
+                               desc="Performing power operation "
+                                    + operation) as pbar:
+                    wait_for_tasks(tasks, timeout=60 * len(tasks),
+                                   progress=pbar.update)
+                    self._wait_for_guests(guest, operation, pbar)
 
         else:
             vm = resolve_path(self.server, "VM")[0]
@@ -229,6 +259,28 @@ class VmPower(VsphereScript):
                            "to '%s'", vm.name, operation)
             vm.change_state(operation, attempt_guest)
 
+    def _wait_for_guests(self, vms, operation, pbar):
+        """
+        Waits for guest OS power operations to change the power state of VMs.
+
+        :param list(VM) vms: VMs the guest operation was started on
+        :param str operation: Power operation that was performed
+        :param pbar: Progress bar to update as the VMs change state
+        """
+        power_state = GUEST_POWER_STATES.get(operation)
+        if not vms or power_state is None:
+            # Guest reboots don't change the power state, so there's
+            # nothing to wait for once they've started
+            pbar.update(len(vms))
+            return
+        pending = wait_for_power_state([vm.get_vim_vm() for vm in vms],
+                                       power_state, timeout=120)
+        pbar.update(len(vms) - len(pending))
+        for vm in vms:
+            if vm.get_vim_vm() in pending:
+                self._log.error("VM '%s' did not change state to '%s' "
+                                "within 120 seconds", vm.name, operation)
+
 
 class VsphereInfo(VsphereScript):
     """Query information about a vSphere environment and objects within it."""
@@ -262,15 +314,15 @@ class VsphereInfo(VsphereScript):
         # Folder
         elif thing_type == "folder":
             folder, folder_name = resolve_path(self.server, "folder")
-            if "VirtualMachine" in folder.childType \
-                    and prompt_for_confirmation("Want to see power state "
-                                                "of VMs in the folder?"):
-                contents = folder.enumerate(recursive=True, power_status=True)
-            else:
-                contents = folder.enumerate(recursive=True, power_status=False)
+            child_types = folder.childType  # Only fetch this once
+            power_status = "VirtualMachine" in child_types \
+                and prompt_for_confirmation("Want to see power state "
+                                            "of VMs in the folder?")
+            contents = folder.enumerate(recursive=True,
+                                        power_status=power_status)
             self._log.info("Information for Folder %s\n"
                            "Types of items folder can contain: %s\n%s",
-                           folder_name, str(folder.childType),
+                           folder_name, str(child_types),
                            format_structure(contents))
 
         # That's not a thing!
@@ -315,16 +367,25 @@ class VmSnapshot(VsphereScript):
             vms = [resolve_path(self.server, "vm",
                                 "to perform snapshot operations on")[0]]
 
+        if op == "create":
+            # Start all of the snapshots, then wait on them at once
+            tasks = [vm.create_snapshot_async(name=name, description=desc,
+                                              memory=memory, quiesce=quiesce)
+                     for vm in vms]
+            with tqdm.tqdm(total=len(tasks), unit="VMs",
+                           desc="Taking snapshots") as pbar:
+                # Each snapshot gets as long as it had when waited on alone
+                wait_for_tasks(tasks, timeout=60 * len(tasks),
+                               progress=pbar.update)
+            return
+
         # Perform the operations
         pbar = tqdm.tqdm(vms, total=len(vms), unit="VMs",
                          desc="Taking snapshots")
         for vm in pbar:
             self._log.info("Performing operation '%s' on VM '%s'", op, vm.name)
             pbar.set_postfix_str(vm.name)
-            if op == "create":
-                vm.create_snapshot(name=name, description=desc,
-                                   memory=memory, quiesce=quiesce)
-            elif op == "revert":
+            if op == "revert":
                 vm.revert_to_snapshot(snapshot=name)
             elif op == "revert-current":
                 vm.revert_to_current_snapshot()
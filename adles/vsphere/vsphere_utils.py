@@ -1,19 +1,50 @@
 import logging
-from time import sleep, time
+from functools import lru_cache
+from time import monotonic, sleep
 
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 
-from adles.utils import read_json, user_input
+from adles.utils import read_json, sizeof_fmt, user_input
 
 SLEEP_INTERVAL = 0.05
+MAX_SLEEP_INTERVAL = 2.0
 LONG_SLEEP = 1.0
 
+# Task properties that are watched when waiting for tasks
+TASK_PROPERTIES = ["info.state", "info.result", "info.error",
+                   "info.descriptionId", "info.entityName"]
+
+# Datastores in an environment tend to share the same sizes
+_sizeof_fmt = lru_cache(maxsize=1024)(sizeof_fmt)
+
+# Datastore properties used by get_datastore_info
+DATASTORE_PROPERTIES = ["summary", "host", "vm"]
+
+# Layout of the summary made by get_datastore_info
+_DS_TEMPLATE = ("\n"
+                "Name                  : {name}\n"
+                "URL                   : {url}\n"
+                "Capacity              : {capacity}\n"
+                "Free Space            : {free}\n"
+                "Uncommitted           : {uncommitted}\n"
+                "Provisioned           : {provisioned}\n"
+                "{overprovisioned}"
+                "Hosts                 : {hosts:d}\n"
+                "Virtual Machines      : {vms:d}")
+_DS_OVERP_LINE = "Over-provisioned      : {size} / {percent:d} %\n"
+
+# If install_vim_extensions has injected the helpers into the vim classes
+_vim_extensions_installed = False
+
+# ServiceContent of each server connection, keyed by SOAP stub
+_service_content = {}
+
 
 class VsphereException(Exception):
     pass
 
 
-def wait_for_task(task, timeout=60.0, pause_timeout=True):
+def wait_for_task(task, timeout=60.0, pause_timeout=True, progress=None):
     """
     Waits for a single vim.Task to finish and returns its result.
 
@@ -22,40 +53,33 @@ def wait_for_task(task, timeout=60.0, pause_timeout=True):
     :param float timeout: Number of seconds to wait before terminating task
     :param bool pause_timeout: Pause timeout counter while task
     is queued on server
+    :param progress: Function called with the percentage of the task
+    that's complete (int) each time the server reports a change
     :return: Task result information (task.info.result)
     :rtype: str or None
     """
     if not task:  # Check if there's actually a task
         logging.error("No task was specified to wait for")
         return None
-    name = str(task.info.descriptionId)
-    obj = str(task.info.entityName)
-    wait_time = 0.0
-    end_time = time() + float(timeout)  # Set end time
+    task_info = task.info  # Fetch the task's information only once
+    name = str(task_info.descriptionId)
+    obj = str(task_info.entityName)
     try:
-        while True:
-            if task.info.state == 'success':  # It succeeded!
-                # Return the task result if it was successful
-                return task.info.result
-            elif task.info.state == 'error':  # It failed...
-                logging.error("Error during task %s on object '%s': %s",
-                              name, obj, str(task.info.error.msg))
-                return None
-            elif time() > end_time:  # Check if it has exceeded the timeout
-                logging.error("Task %s timed out after %s seconds",
-                              name, str(wait_time))
-                task.CancelTask()  # Cancel the task since we've timed out
-                return None
-            elif task.info.state == 'queued':
-                sleep(LONG_SLEEP)  # Sleep longer if it's queued up on system
-                # Don't count queue time against the timeout
-                if pause_timeout is True:
-                    end_time += LONG_SLEEP
-                wait_time += LONG_SLEEP
-            else:
-                # Wait a bit so we don't waste resources checking state
-                sleep(SLEEP_INTERVAL)
-                wait_time += SLEEP_INTERVAL
+        try:
+            info = _wait_for_updates(task, timeout, pause_timeout, progress)
+        except vmodl.fault.MethodNotFound:
+            # WaitForUpdatesEx was added in vSphere 4.1, so poll older servers
+            info = _poll_task(task, timeout, pause_timeout, progress)
+        if info is None:  # It exceeded the timeout
+            logging.error("Task %s timed out after %s seconds",
+                          name, timeout)
+            task.CancelTask()  # Cancel the task since we've timed out
+        elif info["info.state"] == 'success':  # It succeeded!
+            # Return the task result if it was successful
+            return info.get("info.result")
+        else:  # It failed...
+            logging.error("Error during task %s on object '%s': %s",
+                          name, obj, info["info.error"].msg)
     except vim.fault.NoPermission as e:
         logging.error("Permission denied for task %s on %s: need privilege %s",
                       name, obj, e.privilegeId)
@@ -69,7 +93,7 @@ def wait_for_task(task, timeout=60.0, pause_timeout=True):
                       name, obj, e.existingState)
     except vim.fault.InvalidState as e:
         logging.error("Cannot complete task %s: "
-                      "invalid state for %s\n%s", name, obj, str(e))
+                      "invalid state for %s\n%s", name, obj, e)
     except vim.fault.CustomizationFault:
         logging.error("Cannot complete task %s: "
                       "invalid customization for %s", name, obj)
@@ -97,12 +121,329 @@ def wait_for_task(task, timeout=60.0, pause_timeout=True):
     return None
 
 
-# This line allows calling "<task>.wait(<params>)"
-# instead of "wait_for_task(task, params)"
-#
-# This works because the implicit first argument
-# to a class method call in Python is the instance
-vim.Task.wait = wait_for_task  # Inject into vim.Task class
+def _create_task_collector(tasks, paths=TASK_PROPERTIES):
+    """
+    Creates a PropertyCollector that watches the state of tasks.
+
+    :param tasks: Tasks to watch
+    :type tasks: list(vim.Task)
+    :param list paths: Task properties to watch
+    :return: The collector, which must be destroyed when done with
+    :rtype: vmodl.query.PropertyCollector
+    """
+    return _create_private_collector(tasks, vim.Task, paths)
+
+
+def _create_private_collector(objs, vimtype, paths):
+    """
+    Creates a PropertyCollector for a single waiter with a filter
+    on properties of the objects. Waiters sharing the session's collector
+    would see each other's filters and update versions.
+
+    :param list objs: Managed objects to watch
+    :param vimtype: Type of the objects
+    :param list(str) paths: Properties to watch
+    :return: The collector, which must be destroyed when done with
+    (destroying it also destroys its filter)
+    :rtype: vmodl.query.PropertyCollector
+    """
+    pc = vmodl.query.PropertyCollector
+    collector = get_collector(objs[0]).CreatePropertyCollector()
+    try:
+        collector.CreateFilter(pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=obj) for obj in objs],
+            propSet=[pc.PropertySpec(type=vimtype, pathSet=paths)]), True)
+    except Exception:
+        collector.DestroyPropertyCollector()
+        raise
+    return collector
+
+
+def _apply_updates(update, infos):
+    """
+    Applies the changes in a PropertyCollector update to the known
+    properties of the tasks being watched.
+
+    :param update: Update returned by WaitForUpdatesEx
+    :type update: vmodl.query.PropertyCollector.UpdateSet
+    :param dict infos: Properties of each task, keyed by task
+    :return: Tasks that were changed by the update
+    :rtype: list(vim.Task)
+    """
+    changed = []
+    for filter_update in update.filterSet:
+        for obj_update in filter_update.objectSet:
+            info = infos.setdefault(obj_update.obj, {})
+            for change in obj_update.changeSet:
+                info[change.name] = change.val
+            changed.append(obj_update.obj)
+    return changed
+
+
+def _wait_for_updates(task, timeout, pause_timeout, progress=None):
+    """
+    Waits for a task to finish by blocking until the server sends changes
+    to the task's state, instead of repeatedly polling it.
+
+    :param task: The task to wait for
+    :type task: vim.Task
+    :param float timeout: Number of seconds to wait
+    :param bool pause_timeout: Pause timeout counter while task
+    is queued on server
+    :param progress: Function called with the task's percent complete
+    :return: Final properties of the task, or None if it timed out
+    :rtype: dict or None
+    """
+    # Only ask for progress updates if something is listening for them
+    paths = TASK_PROPERTIES + ["info.progress"] if progress else TASK_PROPERTIES
+    collector = _create_task_collector([task], paths)
+    options = vmodl.query.PropertyCollector.WaitOptions()
+    infos = {task: {}}
+    version = None
+    percent = None
+    end_time = monotonic() + float(timeout)  # Set end time
+    try:
+        while infos[task].get("info.state") not in ('success', 'error'):
+            # Don't count queue time against the timeout
+            queued = pause_timeout and infos[task].get("info.state") == 'queued'
+            if queued:
+                options.maxWaitSeconds = None  # Wait until it leaves queue
+            else:
+                remaining = end_time - monotonic()
+                if remaining <= 0:
+                    return None
+                options.maxWaitSeconds = int(remaining) + 1
+            start = monotonic()
+            update = collector.WaitForUpdatesEx(version, options)
+            if queued:
+                end_time += monotonic() - start
+            if update is not None:  # None if nothing changed before maxWait
+                version = update.version
+                _apply_updates(update, infos)
+                if progress is not None:
+                    percent = _report_progress(
+                        infos[task].get("info.progress"), percent, progress)
+    finally:
+        collector.DestroyPropertyCollector()
+    return infos[task]
+
+
+def _poll_task(task, timeout, pause_timeout, progress=None):
+    """
+    Waits for a task to finish by polling its state.
+    Used for servers that don't support WaitForUpdatesEx.
+
+    :param task: The task to wait for
+    :type task: vim.Task
+    :param float timeout: Number of seconds to wait
+    :param bool pause_timeout: Pause timeout counter while task
+    is queued on server
+    :param progress: Function called with the task's percent complete
+    :return: Final properties of the task, or None if it timed out
+    :rtype: dict or None
+    """
+    end_time = monotonic() + float(timeout)  # Set end time
+    interval = SLEEP_INTERVAL
+    last_state = None
+    percent = None
+    while True:
+        info = task.info  # Only fetch the task's information once per check
+        state = info.state
+        if progress is not None:
+            percent = _report_progress(info.progress, percent, progress)
+        if state != last_state:  # Check quickly again after a state change
+            interval = SLEEP_INTERVAL
+            last_state = state
+        if state in ('success', 'error'):
+            return {"info.state": state,
+                    "info.result": info.result,
+                    "info.error": info.error}
+        elif monotonic() > end_time:  # Check if it has exceeded the timeout
+            return None
+        elif state == 'queued':
+            sleep(LONG_SLEEP)  # Sleep longer if it's queued up on system
+            # Don't count queue time against the timeout
+            if pause_timeout is True:
+                end_time += LONG_SLEEP
+        else:
+            # Back off so long-running tasks aren't checked constantly
+            sleep(interval)
+            interval = min(interval * 1.5, MAX_SLEEP_INTERVAL)
+
+
+def _report_progress(percent, last_percent, progress):
+    """
+    Reports a task's progress if it has changed since it was last reported.
+
+    :param int percent: Percentage of the task that's complete, if known
+    :param int last_percent: Percentage that was last reported
+    :param progress: Function to report the progress to
+    :return: The percentage that has now been reported
+    :rtype: int or None
+    """
+    if percent is not None and percent != last_percent:
+        progress(percent)
+        return percent
+    return last_percent
+
+
+def wait_for_tasks(tasks, timeout=60.0, pause_timeout=True, progress=None):
+    """
+    Waits for multiple vim.Tasks to finish and returns their results.
+
+    All of the tasks are watched using a single PropertyCollector filter,
+    so the server notifies us when they change instead of being polled.
+
+    :param tasks: The tasks to wait for
+    :type tasks: list(vim.Task)
+    :param float timeout: Number of seconds to wait before cancelling
+    any unfinished tasks
+    :param bool pause_timeout: Pause timeout counter while any of the tasks
+    are queued on server
+    :param progress: Function called (with no arguments)
+    each time a task finishes
+    :return: Result of each task (None if the task failed),
+    in the same order as the tasks
+    :rtype: list
+    """
+    tasks = list(tasks)
+    results = _wait_for_all(tasks, timeout, pause_timeout, progress)
+    return [results[task][1] if task else None for task in tasks]
+
+
+def wait_for_tasks_success(tasks, timeout=60.0, pause_timeout=True,
+                           progress=None):
+    """
+    Waits for multiple vim.Tasks to finish and returns if each succeeded.
+    Useful for tasks that don't have a result, e.g. destroying objects.
+
+    :param tasks: The tasks to wait for
+    :type tasks: list(vim.Task)
+    :param float timeout: Number of seconds to wait before cancelling
+    any unfinished tasks
+    :param bool pause_timeout: Pause timeout counter while any of the tasks
+    are queued on server
+    :param progress: Function called (with no arguments)
+    each time a task finishes
+    :return: If each task succeeded, in the same order as the tasks
+    :rtype: list(bool)
+    """
+    tasks = list(tasks)
+    results = _wait_for_all(tasks, timeout, pause_timeout, progress)
+    return [results[task][0] if task else False for task in tasks]
+
+
+def _wait_for_all(tasks, timeout, pause_timeout, progress):
+    """
+    Waits for multiple vim.Tasks to finish, cancelling any that time out.
+
+    :param tasks: The tasks to wait for (tasks that are None are ignored)
+    :type tasks: list(vim.Task)
+    :param float timeout: Number of seconds to wait
+    :param bool pause_timeout: Pause timeout counter while any of the tasks
+    are queued on server
+    :param progress: Function called each time a task finishes
+    :return: If each task succeeded and its result
+    :rtype: dict(vim.Task, tuple(bool, object))
+    """
+    pending = set(task for task in tasks if task)
+    results = {task: (False, None) for task in pending}
+    if not pending:
+        return results
+    collector = _create_task_collector(list(pending))
+    options = vmodl.query.PropertyCollector.WaitOptions()
+    infos = {task: {} for task in pending}  # Latest known task properties
+    end_time = monotonic() + float(timeout)
+    version = None
+    try:
+        while pending:
+            # Don't count time where tasks are only queued against the timeout
+            queued = pause_timeout and any(
+                infos[task].get("info.state") == 'queued' for task in pending)
+            if queued:
+                options.maxWaitSeconds = None  # Wait until something changes
+            else:
+                remaining = end_time - monotonic()
+                if remaining <= 0:
+                    break
+                options.maxWaitSeconds = int(remaining) + 1
+            start = monotonic()
+            update = collector.WaitForUpdatesEx(version, options)
+            if queued:
+                end_time += monotonic() - start
+            if update is None:  # Nothing changed before maxWaitSeconds
+                continue
+            version = update.version
+            for task in _apply_updates(update, infos):
+                info = infos[task]
+                state = info.get("info.state")
+                if task not in pending or state not in ('success', 'error'):
+                    continue
+                pending.discard(task)
+                if state == 'success':
+                    results[task] = (True, info.get("info.result"))
+                else:
+                    logging.error("Error during task %s on object '%s': %s",
+                                  info.get("info.descriptionId"),
+                                  info.get("info.entityName"),
+                                  info["info.error"].msg)
+                if progress is not None:
+                    progress()
+    finally:
+        collector.DestroyPropertyCollector()
+
+    for task in pending:  # Cancel any tasks that have timed out
+        logging.error("Task %s on object '%s' timed out after %s seconds",
+                      infos[task].get("info.descriptionId"),
+                      infos[task].get("info.entityName"), timeout)
+        try:
+            task.CancelTask()
+        except vmodl.MethodFault as e:
+            logging.error("Could not cancel task %s: %s", task, e.msg)
+    return results
+
+
+def wait_for_power_state(vms, power_state, timeout=120.0):
+    """
+    Waits for VMs to reach a power state, e.g. after guest OS operations,
+    which don't have a task that can be waited on.
+
+    All of the VMs are watched using a single PropertyCollector.
+
+    :param vms: VMs to wait for
+    :type vms: list(vim.VirtualMachine)
+    :param power_state: Power state to wait for
+    :type power_state: vim.VirtualMachine.PowerState
+    :param float timeout: Number of seconds to wait
+    :return: VMs that did not reach the power state before the timeout,
+    in the same order as the VMs
+    :rtype: list(vim.VirtualMachine)
+    """
+    pending = set(vms)
+    if not pending:
+        return []
+    collector = _create_private_collector(list(pending), vim.VirtualMachine,
+                                          ["runtime.powerState"])
+    options = vmodl.query.PropertyCollector.WaitOptions()
+    states = {}
+    end_time = monotonic() + float(timeout)
+    version = None
+    try:
+        while pending:
+            remaining = end_time - monotonic()
+            if remaining <= 0:
+                break
+            options.maxWaitSeconds = int(remaining) + 1
+            update = collector.WaitForUpdatesEx(version, options)
+            if update is None:  # Nothing changed before maxWaitSeconds
+                continue
+            version = update.version
+            for vm in _apply_updates(update, states):
+                if states[vm].get("runtime.powerState") == power_state:
+                    pending.discard(vm)
+    finally:
+        collector.DestroyPropertyCollector()
+    return [vm for vm in vms if vm in pending]
 
 
 # From: list_dc_datastore_info in pyvmomi-community-samples
@@ -118,31 +459,50 @@ def get_datastore_info(ds_obj):
     if not ds_obj:
         logging.error("No Datastore was given to get_datastore_info")
         return ""
-    from adles.utils import sizeof_fmt
-    info_string = "\n"
-    summary = ds_obj.summary
+    # Get everything needed in one query instead of one for each property
+    props = retrieve_properties(
+        [vmodl.query.PropertyCollector.ObjectSpec(obj=ds_obj)],
+        {vim.Datastore: DATASTORE_PROPERTIES}).get(ds_obj, {})
+    summary = props["summary"]
     ds_capacity = summary.capacity
     ds_freespace = summary.freeSpace
     ds_uncommitted = summary.uncommitted if summary.uncommitted else 0
     ds_provisioned = ds_capacity - ds_freespace + ds_uncommitted
     ds_overp = ds_provisioned - ds_capacity
-    ds_overp_pct = (ds_overp * 100) / ds_capacity if ds_capacity else 0
-
-    info_string += "Name                  : %s\n" % summary.name
-    info_string += "URL                   : %s\n" % summary.url
-    info_string += "Capacity              : %s\n" % sizeof_fmt(ds_capacity)
-    info_string += "Free Space            : %s\n" % sizeof_fmt(ds_freespace)
-    info_string += "Uncommitted           : %s\n" % sizeof_fmt(ds_uncommitted)
-    info_string += "Provisioned           : %s\n" % sizeof_fmt(ds_provisioned)
+    ds_overp_pct = (ds_overp * 100) // ds_capacity if ds_capacity else 0
+
     if ds_overp > 0:
-        info_string += "Over-provisioned      : %s / %s %%\n" \
-                       % (sizeof_fmt(ds_overp), ds_overp_pct)
-    info_string += "Hosts                 : %d\n" % len(ds_obj.host)
-    info_string += "Virtual Machines      : %d" % len(ds_obj.vm)
-    return info_string
+        overprovisioned = _DS_OVERP_LINE.format(
+            size=_sizeof_fmt(ds_overp), percent=ds_overp_pct)
+    else:
+        overprovisioned = ""
+    return _DS_TEMPLATE.format_map({
+        "name": summary.name,
+        "url": summary.url,
+        "capacity": _sizeof_fmt(ds_capacity),
+        "free": _sizeof_fmt(ds_freespace),
+        "uncommitted": _sizeof_fmt(ds_uncommitted),
+        "provisioned": _sizeof_fmt(ds_provisioned),
+        "overprovisioned": overprovisioned,
+        "hosts": len(props.get("host", [])),
+        "vms": len(props.get("vm", []))})
 
 
-vim.Datastore.get_info = get_datastore_info
+def install_vim_extensions():
+    """
+    Injects the helper methods into the vim classes, e.g. allowing
+    "<task>.wait(<params>)" instead of "wait_for_task(task, params)".
+    This is done once, when the first server connection is made,
+    instead of as a side effect of importing the module.
+    """
+    global _vim_extensions_installed
+    if _vim_extensions_installed:
+        return
+    # This works because the implicit first argument
+    # to a class method call in Python is the instance
+    vim.Task.wait = wait_for_task  # Inject into vim.Task class
+    vim.Datastore.get_info = get_datastore_info
+    _vim_extensions_installed = True
 
 
 def make_vsphere(filename=None):
@@ -184,17 +544,22 @@ def resolve_path(server, thing, prompt=""):
     """
     # TODO: use pathlib
     from adles.vsphere.vm import VM
-    if thing.lower() == "vm":
-        get = server.get_vm
+    is_vm_thing = thing.lower() == "vm"
+    if is_vm_thing:
+        by_name = server.get_vm
     elif thing.lower() == "folder":
-        get = server.get_folder
+        by_name = server.get_folder
     else:
         logging.error("Invalid thing passed to resolve_path: %s", thing)
         raise ValueError
-    res = user_input("Name of or path to %s %s: " % (thing, prompt), thing,
-                     lambda x: server.find_by_inv_path("vm/" + x)
-                     if '/' in x else get(x))
-    if thing.lower() == "vm":
+    by_path = server.find_by_inv_path
+
+    def find(name):
+        return by_path("vm/" + name) if '/' in name else by_name(name)
+
+    res = user_input("Name of or path to %s %s: " % (thing, prompt),
+                     thing, find)
+    if is_vm_thing:
         return VM(vm=res[0]), res[1]
     else:
         return res
@@ -208,7 +573,7 @@ def is_folder(obj):
     :return: If the object is a folder
     :rtype: bool
     """
-    return hasattr(obj, "childEntity")
+    return isinstance(obj, vim.Folder)
 
 
 def is_vm(obj):
@@ -219,4 +584,86 @@ def is_vm(obj):
     :return: If the object is a VM
     :rtype: bool
     """
-    return hasattr(obj, "summary")
+    return isinstance(obj, vim.VirtualMachine)
+
+
+def get_content(obj):
+    """
+    Gets the ServiceContent of the server a managed object belongs to.
+    This is only retrieved from the server once per connection.
+
+    :param obj: Managed object to get the content for
+    :type obj: vim.ManagedObject
+    :return: The server's ServiceContent
+    :rtype: vim.ServiceInstanceContent
+    """
+    stub = obj._stub
+    content = _service_content.get(stub)
+    if content is None:
+        content = vim.ServiceInstance("ServiceInstance",
+                                      stub).RetrieveContent()
+        _service_content[stub] = content
+    return content
+
+
+def get_collector(obj):
+    """
+    Gets the PropertyCollector of the server a managed object belongs to.
+
+    :param obj: Managed object to get the collector for
+    :type obj: vim.ManagedObject
+    :return: The server's PropertyCollector
+    :rtype: vmodl.query.PropertyCollector
+    """
+    return get_content(obj).propertyCollector
+
+
+def retrieve_properties(obj_specs, prop_specs, collector=None):
+    """
+    Retrieves properties of many managed objects using a single
+    PropertyCollector query, instead of one round-trip per property access.
+
+    :param obj_specs: Objects to collect properties from
+    :type obj_specs: list(vmodl.query.PropertyCollector.ObjectSpec)
+    :param dict prop_specs: Property paths to collect, keyed by vimtype
+    :param collector: PropertyCollector to use
+    (Default: collector of the first object)
+    :type collector: vmodl.query.PropertyCollector or None
+    :return: Properties of each object that was collected
+    :rtype: dict(vimtype, dict(str, value))
+    """
+    if not obj_specs:
+        return {}
+    if collector is None:
+        collector = get_collector(obj_specs[0].obj)
+    pc = vmodl.query.PropertyCollector
+    filter_spec = pc.FilterSpec(
+        objectSet=obj_specs,
+        propSet=[pc.PropertySpec(type=vimtype, pathSet=list(paths))
+                 for vimtype, paths in prop_specs.items()])
+    properties = {}
+    result = collector.RetrievePropertiesEx([filter_spec],
+                                            pc.RetrieveOptions())
+    while result is not None:
+        for obj_content in result.objects:
+            properties[obj_content.obj] = {prop.name: prop.val
+                                           for prop in obj_content.propSet}
+        if not result.token:  # No more pages of results
+            break
+        result = collector.ContinueRetrievePropertiesEx(result.token)
+    return properties
+
+
+def get_names(objs):
+    """
+    Gets the names of many managed entities in a single query.
+
+    :param objs: Managed entities to get the names of
+    :type objs: list(vim.ManagedEntity)
+    :return: Name of each entity
+    :rtype: dict(vim.ManagedEntity, str)
+    """
+    ObjectSpec = vmodl.query.PropertyCollector.ObjectSpec
+    props = retrieve_properties([ObjectSpec(obj=obj) for obj in objs],
+                                {vim.ManagedEntity: ["name"]})
+    return {obj: prop.get("name") for obj, prop in props.items()}
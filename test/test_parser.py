@@ -0,0 +1,78 @@
+def test_verify_exercise_syntax_fast_fail(caplog):
+    from adles.parser import verify_exercise_syntax
+
+    spec = {"metadata": {}}  # Missing required keys in the first section
+    assert verify_exercise_syntax(spec, fast_fail=True) == (3, 3)
+    assert "Required definition groups was not found" not in caplog.text
+
+    caplog.clear()
+    assert verify_exercise_syntax(spec, fast_fail=False) == (7, 3)
+    for section in ("groups", "services", "networks", "folders"):
+        assert "Required definition %s was not found" % section \
+            in caplog.text
+
+
+def test_verify_exercise_syntax_unknown_section(caplog):
+    from adles.parser import verify_exercise_syntax
+
+    spec = {"metadata": {}}
+    errors, warnings = verify_exercise_syntax(spec)
+    # Fields that describe the specification itself are known definitions
+    spec["spec-type"] = "exercise"
+    spec["spec-version"] = "0.8.0"
+    assert verify_exercise_syntax(spec) == (errors, warnings)
+    assert "Unknown definition" not in caplog.text
+    spec["netwrks"] = {}  # Misspelled section name
+    assert verify_exercise_syntax(spec) == (errors, warnings + 1)
+    assert 'Unknown definition "netwrks" will be ignored' in caplog.text
+    assert any(record.levelname == "WARNING" and "netwrks" in record.message
+               for record in caplog.records)
+
+
+def test_parse_yaml_reloads_and_copies(tmp_path):
+    import os
+    from adles.parser import parse_yaml
+
+    path = tmp_path / "spec.yaml"
+    path.write_text("metadata:\n  name: first\n")
+    result = parse_yaml(str(path))
+    assert result == {"metadata": {"name": "first"}}
+
+    # Modifying the result doesn't change what later calls return
+    result["metadata"]["name"] = "modified"
+    assert parse_yaml(str(path)) == {"metadata": {"name": "first"}}
+
+    # The file is read again once it's modified, even if the modification
+    # time is unchanged, e.g. when it's written twice within its resolution
+    mtime = os.stat(str(path)).st_mtime_ns
+    path.write_text("metadata:\n  name: second version\n")
+    os.utime(str(path), ns=(mtime, mtime))
+    assert parse_yaml(str(path)) == {"metadata": {"name": "second version"}}
+
+
+def test_verify_scalar_service_definitions(caplog):
+    from adles.parser import _verify_folders_syntax, _verify_services_syntax
+
+    assert _verify_services_syntax({"svc": "ubuntu"}) == (1, 0)
+    assert "Invalid service definition: svc" in caplog.text
+
+    folders = {"f": {"group": "g", "services": {"s": "ubuntu"}}}
+    assert _verify_folders_syntax(folders) == (1, 0)
+    assert "Invalid configuration for service s in folder 'f'" in caplog.text
+
+
+def test_verify_network_invalid_subnet(caplog):
+    from adles.parser import _verify_network
+
+    assert _verify_network("unique-networks",
+                           {"net": {"subnet": ["10.0.0.0/24"]}}) == (1, 0)
+    assert "Invalid format for subnet" in caplog.text
+
+
+def test_check_syntax_not_a_mapping(tmp_path, caplog):
+    from adles.parser import check_syntax
+
+    path = tmp_path / "spec.yaml"
+    path.write_text("just some text\n")
+    assert check_syntax(str(path)) is None
+    assert "Specification must be a mapping of definitions" in caplog.text
@@ -10,6 +10,11 @@ def test_sizeof_fmt():
     assert sizeof_fmt(10000) == '9.8KB'
     assert sizeof_fmt(1000000000) == '953.7MB'
     assert sizeof_fmt(100000000000000000) == '90949.5TB'
+    assert sizeof_fmt(1023.99) == '1024.0bytes'
+    assert sizeof_fmt(1048575) == '1024.0KB'
+    assert sizeof_fmt(1048576) == '1.0MB'
+    assert sizeof_fmt(1099511627776) == '1.0TB'
+    assert sizeof_fmt(-2048) == '-2048.0bytes'
 
 
 def test_pad():
@@ -20,6 +25,7 @@ def test_pad():
     assert pad(9, 3) == "009"
     assert pad(value=10, length=4) == "0010"
     assert pad(50, 5) == "00050"
+    assert pad(123, 2) == "123"
 
 
 def test_split_path():
@@ -41,8 +47,13 @@ def test_get_vlan():
     pass
 
 
-def test_read_json():
+def test_read_json(tmp_path):
     from adles.utils import read_json
 
     # assert isinstance(read_json('../users.json'), dict)
     assert read_json('lame.jpg') is None
+
+    users = tmp_path / 'users.json'
+    users.write_text('{"user": "pass"}')
+    read_json(str(users))["user"] = "changed"
+    assert read_json(str(users)) == {"user": "pass"}
@@ -0,0 +1,25 @@
+from unittest import mock
+
+
+def test_get_by_name_rename():
+    from pyVmomi import vim
+    from adles.vsphere import vsphere_class
+    from adles.vsphere.vsphere_class import Vsphere
+
+    server = Vsphere.__new__(Vsphere)  # Skip connecting to a server
+    server._name_index = {}
+    container = vim.Folder("group-v1")
+    vm = vim.VirtualMachine("vm-1")
+    names = {vm: "Old"}
+    collect = mock.patch.object(
+        Vsphere, "_collect_names",
+        side_effect=lambda *args: list(names.items()))
+    get_names = mock.patch.object(
+        vsphere_class, "get_names",
+        side_effect=lambda objs: {obj: names[obj] for obj in objs})
+    with collect, get_names:
+        assert server.get_by_name(vim.VirtualMachine, "old", container) is vm
+        names[vm] = "New"  # Renamed after the index was built
+        assert server.get_by_name(vim.VirtualMachine, "old",
+                                  container) is None
+        assert server.get_by_name(vim.VirtualMachine, "new", container) is vm